@@ -1,10 +1,12 @@
 import os.path
+import sys
 import argparse
 import csv
+import itertools
 
 from . import about
 from . import reader
-from .writer import pack, pack_mdd_file, pack_mdx_txt, pack_mdx_db, pack_mdd_db, \
+from .writer import pack, iter_mdd_file, iter_mdx_txt, iter_mdx_db, iter_mdd_db, \
     txt2db, db2txt
 from .utils import ElapsedTimer
 
@@ -29,16 +31,30 @@ def run():
                         help='show version')
     parser.add_argument('-k', dest='key', action='store_true', help='show mdx/mdd keys')
     parser.add_argument('-m', dest='meta', action='store_true', help='show mdx/mdd meta information')
-    parser.add_argument('-q', dest='query', metavar='<key>', help='query KEY from mdx/mdd')
+    parser.add_argument('-q', dest='query', metavar='<key>',
+                        help='query KEY from mdx/mdd. "@<file>" query all keys in file, "@-" from stdin')
+    parser.add_argument('--normalize', action='store_true',
+                        help='query again ignoring case, accents and punctuation if key is not found')
+    parser.add_argument('--prefix', metavar='<prefix>', help='show keys starting with PREFIX')
+    parser.add_argument('--fuzzy', metavar='<word>', help='show keys similar to WORD')
+    parser.add_argument('--distance', metavar='<number>', type=int, default=2, help='max edit distance for fuzzy')
+    parser.add_argument('--search', metavar='<text>', help='show keys whose record contains all words of TEXT')
+    parser.add_argument('--build-fts', action='store_true', help='build full text index "<mdx>.fts" for --search')
+    parser.add_argument('--limit', metavar='<number>', type=int, help='max number of keys to show')
+    parser.add_argument('--index', action='store_true', help='use key index file "<mdx/mdd>.idx", create it if need')
+    parser.add_argument('--lazy', action='store_true', help='only decode needed key blocks when query')
+    parser.add_argument('--jobs', metavar='<number>', type=int, help='number of workers to decode or compress blocks')
     parser.add_argument('--txt-db', action='store_true', help='convert mdx txt to sqlite3 db. <mdx/mdd> is ".txt"')
     parser.add_argument('--db-txt', action='store_true', help='convert sqlite3 db to mdx txt. <mdx/mdd> is ".db"')
     parser.add_argument('mdict', metavar='<mdx/mdd>', help='Dictionary MDX/MDD file')
+    parser.add_argument('mdd', metavar='<mdd>', nargs='*', help='Resource MDD files for server')
 
     group = parser.add_argument_group('Reader')
     group.add_argument('-x', dest='extract', action='store_true', help='extract mdx/mdd file.')
     group.add_argument('-d', dest='exdir', metavar='<exdir>', help='extract mdx/mdd to directory')
     group.add_argument('--exdb', action='store_true', help='extract mdx/mdd to DB')
     group.add_argument('--exdb-zip', action='store_true', help='extract mdx/mdd to DB with ZIP compress')
+    group.add_argument('--exdb-fts', action='store_true', help='extract mdx to DB with FTS5 full text search table')
     group.add_argument('--split-n', metavar='<number>', help='split MDX TXT to N files')
     group.add_argument('--split-az', action='store_true', help='split MDX TXT to files by a...z')
 
@@ -49,7 +65,18 @@ def run():
     group.add_argument('--encoding', metavar='<encoding>', default='utf-8', help='mdx txt file encoding')
     group.add_argument('--key-size', metavar='<size>', type=int, default=32, help='Key block size. unit: KB')
     group.add_argument('--record-size', metavar='<size>', type=int, default=64, help='Record block size. unit: KB')
+    group.add_argument('--compression', choices=['zlib', 'lzo', 'none'], default='zlib',
+                       help='record block compression, lzo writes engine version 1.2, '
+                       'it is slow (about 1 MB/s) without python-lzo')
     group.add_argument('--key-file', metavar='<key file>', help='only pack some keys in the file')
+    group.add_argument('--memory', metavar='<size>', type=int,
+                       help='sort entries in temporary files with memory of SIZE. unit: MB')
+
+    group = parser.add_argument_group('Server')
+    group.add_argument('--serve', action='store_true', help='serve "/entry/<word>" and "/resource/<path>" by HTTP')
+    group.add_argument('--host', metavar='<host>', default='127.0.0.1', help='server address')
+    group.add_argument('--port', metavar='<port>', type=int, default=8000, help='server port')
+    group.add_argument('--compact', action='store_true', help='keep keys front coded in memory')
 
     group = parser.add_argument_group('Compact HTML')
     group.add_argument('--convert-chtml', action='store_true', help='convert compact html.')
@@ -60,15 +87,35 @@ def run():
 
     if args.meta:
         with ElapsedTimer(verbose=True):
-            meta = reader.meta(args.mdict)
+            meta = reader.meta(args.mdict, index=args.index)
             for k, v in meta.items():
                 print('%s: "%s"' % (k.title(), v))
     elif args.key:
-        keys = reader.get_keys(args.mdict)
+        keys = reader.get_keys(args.mdict, index=args.index)
         count = 0
         for key in keys:
             count += 1
             print(key)
+    elif args.serve:
+        from .server import serve
+        serve(args.mdict, args.mdd, host=args.host, port=args.port, index=args.index,
+              compact=args.compact)
+    elif args.prefix is not None:
+        with ElapsedTimer(verbose=True):
+            for key in reader.prefix(args.mdict, args.prefix, args.limit, index=args.index, lazy=args.lazy):
+                print(key)
+    elif args.fuzzy:
+        with ElapsedTimer(verbose=True):
+            limit = args.limit or 10
+            for key, distance in reader.fuzzy(args.mdict, args.fuzzy, limit, args.distance, index=args.index):
+                print('%s\t%s' % (key, distance))
+    elif args.build_fts:
+        with ElapsedTimer(verbose=True):
+            reader.build_fts(args.mdict)
+    elif args.search:
+        with ElapsedTimer(verbose=True):
+            for key in reader.search(args.mdict, args.search, args.limit, index=args.index):
+                print(key)
     elif args.txt_db:
         with ElapsedTimer(verbose=True):
             total = 0
@@ -81,17 +128,32 @@ def run():
             fmt = '\rConvert "%s": %%s' % args.mdict
             db2txt(args.mdict, callback=make_callback(fmt))
             print()
+    elif args.query and args.query.startswith('@'):
+        # query keys in file, one key per line
+        if args.query == '@-':
+            words = [line.strip() for line in sys.stdin]
+        else:
+            with open(args.query[1:], 'rt', encoding='utf-8') as f:
+                words = [line.strip() for line in f]
+        with ElapsedTimer(verbose=True):
+            for word, record in reader.query_many(
+                    args.mdict, [w for w in words if w], index=args.index, lazy=args.lazy,
+                    normalize=args.normalize):
+                print(word)
+                print(record)
+                print('</>')
     elif args.query:
         # fix dash prefix in shell enviroment
         # mdict -q "\-ment" xxxx.mdx
         query = args.query[1:] if args.query[0] == '\\' else args.query
         with ElapsedTimer(verbose=True):
-            record = reader.query(args.mdict, query)
+            record = reader.query(args.mdict, query, index=args.index, lazy=args.lazy, normalize=args.normalize)
             print(record)
     elif args.extract:
         with ElapsedTimer(verbose=True):
-            if args.exdb or args.exdb_zip:
-                reader.unpack_to_db(args.exdir, args.mdict, zip=args.exdb_zip)
+            if args.exdb or args.exdb_zip or args.exdb_fts:
+                reader.unpack_to_db(args.exdir, args.mdict, zip=args.exdb_zip, fts=args.exdb_fts,
+                                    workers=args.jobs)
             else:
                 if args.split_az:
                     split = 'az'
@@ -99,7 +161,8 @@ def run():
                     split = args.split_n
                 else:
                     split = None
-                reader.unpack(args.exdir, args.mdict, split=split, convert_chtml=args.convert_chtml)
+                reader.unpack(args.exdir, args.mdict, split=split, convert_chtml=args.convert_chtml,
+                              workers=args.jobs)
     elif args.add:
         with ElapsedTimer(verbose=True):
             keys = []
@@ -115,16 +178,20 @@ def run():
                 total = 0
                 if is_mdd:
                     if resource.endswith('.db'):
-                        d = pack_mdd_db(resource, callback=make_callback(fmt))
+                        d = iter_mdd_db(resource, callback=make_callback(fmt))
                     else:
-                        d = pack_mdd_file(resource, callback=make_callback(fmt))
+                        d = iter_mdd_file(resource, callback=make_callback(fmt))
                 else:
                     if resource.endswith('.db'):
-                        d = pack_mdx_db(resource, encoding=args.encoding, callback=make_callback(fmt))
+                        d = iter_mdx_db(resource, encoding=args.encoding, callback=make_callback(fmt))
                     else:
-                        d = pack_mdx_txt(resource, encoding=args.encoding, callback=make_callback(fmt), keys=keys)
-                dictionary.extend(d)
-                print()
+                        d = iter_mdx_txt(resource, encoding=args.encoding, callback=make_callback(fmt), keys=keys)
+                if args.memory:
+                    # resources are scanned when entries are sorted
+                    dictionary = itertools.chain(dictionary, d)
+                else:
+                    dictionary.extend(d)
+                    print()
             print()
             title = ''
             description = ''
@@ -135,7 +202,8 @@ def run():
             print('Pack to "%s"' % args.mdict)
             pack(args.mdict, dictionary, title, description,
                  key_size=args.key_size * 1024, record_size=args.record_size * 1024,
-                 encoding=args.encoding, is_mdd=is_mdd)
+                 encoding=args.encoding, is_mdd=is_mdd, compression=args.compression, jobs=args.jobs,
+                 memory=args.memory and args.memory * 1024 * 1024)
     else:
         parser.print_help()
 
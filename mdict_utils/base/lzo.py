@@ -1,246 +1,251 @@
-import math
-
-
-class FlexBuffer():
-
-    def __init__(self):
-
-        self.blockSize = None
-        self.c = None
-        self.l = None
-        self.buf = None
-
-    def require(self, n):
-        
-        r = self.c - self.l + n
-        if r > 0:
-            self.l = self.l + self.blockSize * math.ceil(r / self.blockSize)
-            #tmp = bytearray(self.l)
-            #for i in len(self.buf):
-            #    tmp[i] = self.buf[i]
-            #self.buf = tmp
-            self.buf = self.buf + bytearray(self.l - len(self.buf))
-        self.c = self.c + n
-        return self.buf
-
-    def alloc(self, initSize, blockSize):
-        
-        if blockSize:
-            sz = blockSize
-        else:
-            sz = 4096
-        self.blockSize = self.roundUp(sz)
-        self.c = 0
-        self.l = self.roundUp(initSize) | 0
-        self.l += self.blockSize - (self.l % self.blockSize)
-        self.buf = bytearray(self.l)
-        return self.buf
-
-    def roundUp(self, n):
-        
-        r = n % 4
-        if r == 0:
-            return n
-        else:
-            return n + 4 - r
+"""
+LZO1X compression and decompression, used by MDict engine version < 2.0.
 
-    def reset(self):
+python-lzo is used if it is installed, else the pure python version,
+which compresses only about 1 MB/s.
+Decompression needs the exact decompressed size, which is stored in MDict block info.
+"""
+from struct import pack
 
-        self.c = 0
-        self.l = len(self.buf)
+try:
+    import lzo as _lzo
+except ImportError:
+    _lzo = None
 
-    def pack(self, size):
-        
-        return self.buf[0:size]
 
-def _decompress(inBuf, outBuf):
+def _read_length(data, ip, t, base):
+    """length of run which is longer than its bit field, return (length, ip)"""
+    start = ip
+    while data[ip] == 0:
+        ip += 1
+    t += (ip - start) * 255 + base + data[ip]
+    return t, ip + 1
 
-    c_top_loop = 1
-    c_first_literal_run = 2
-    c_match = 3
-    c_copy_match = 4
-    c_match_done = 5
-    c_match_next = 6
 
-    out = outBuf.buf
+def _decompress(data, size):
+    out = bytearray(size)
     op = 0
     ip = 0
-    t = inBuf[ip]
-    state = c_top_loop
-    m_pos = 0
-    ip_end = len(inBuf)
+    # state is the number of literals copied after last match, 4 after literal run
+    state = 0
 
+    t = data[0]
     if t > 17:
-        ip = ip + 1
-        t = t - 17
-        if t < 4:
-            state = c_match_next
-        else:
-            out = outBuf.require(t)
-            while True:
-                out[op] = inBuf[ip]
-                op = op + 1
-                ip = ip + 1
-                t = t - 1
-                if not t > 0: break
-            state = c_first_literal_run
+        ip = 1
+        t -= 17
+        if t > size or 1 + t > len(data):
+            raise ValueError('LZO: overrun')
+        out[0:t] = data[1:1 + t]
+        op = ip = t
+        ip += 1
+        state = t if t < 4 else 4
 
     while True:
-        if_block = False
-
-        ##
-        if state == c_top_loop:
-            t = inBuf[ip]
-            ip = ip + 1
-            if t >= 16:
-                state = c_match
-                continue
-            if t == 0:
-                while inBuf[ip] == 0:
-                    t = t + 255
-                    ip = ip + 1
-                t = t + 15 + inBuf[ip]
-                ip = ip + 1
-
-            t = t + 3
-            out = outBuf.require(t)
-            while True:
-                out[op] = inBuf[ip]
-                op = op + 1
-                ip = ip + 1
-                t = t - 1
-                if not t > 0: break
-            # emulate c switch
-            state = c_first_literal_run
-
-        ##
-        if state == c_first_literal_run:
-            t = inBuf[ip]
-            ip = ip + 1
-            if t >= 16:
-                state = c_match
-                continue
-            m_pos = op - 0x801 - (t >> 2) - (inBuf[ip] << 2)
-            ip = ip + 1
-            out = outBuf.require(3)
-            out[op] = out[m_pos]
-            op = op + 1
-            m_pos = m_pos + 1
-            out[op] = out[m_pos]
-            op = op + 1
-            m_pos = m_pos + 1
-            out[op] = out[m_pos]
-            op = op + 1
-
-            state = c_match_done
-            continue
-
-        ##
-        if state == c_match:
-            if t >= 64:
-                m_pos = op - 1 - ((t >> 2) & 7) - (inBuf[ip] << 3)
-                ip = ip + 1
-                t = (t >> 5) - 1
-                state = c_copy_match
-                continue
-            elif t >= 32:
-                t = t & 31
-                if t == 0:
-                    while inBuf[ip] == 0:
-                        t = t + 255
-                        ip = ip + 1
-                    t = t + 31 + inBuf[ip]
-                    ip = ip + 1
-                m_pos = op - 1 - ((inBuf[ip] + (inBuf[ip + 1] << 8)) >> 2)
-                ip = ip + 2
-            elif t >= 16:
-                m_pos = op - ((t & 8) << 11)
-                t = t & 7
+        t = data[ip]
+        ip += 1
+        if t < 16:
+            if state == 0:
+                # literal run
                 if t == 0:
-                    while inBuf[ip] == 0:
-                        t = t + 255
-                        ip = ip + 1
-                    t = t + 7 + inBuf[ip]
-                    ip = ip + 1
-                m_pos = m_pos - ((inBuf[ip] + (inBuf[ip + 1] << 8)) >> 2)
-                ip = ip + 2
-                if m_pos == op:
-                    break
-                m_pos = m_pos - 0x4000
-            else:
-                m_pos = op - 1 - (t >> 2) - (inBuf[ip] << 2);
-                ip = ip + 1
-                out = outBuf.require(2)
-                out[op] = out[m_pos]
-                op = op + 1
-                m_pos = m_pos + 1
-                out[op] = out[m_pos]
-                op = op + 1
-                state = c_match_done
-                continue
-
-            if t >= 6 and (op - m_pos) >= 4:
-                if_block = True
-                t += 2
-                out = outBuf.require(t)
-                while True:
-                    out[op] = out[m_pos]
-                    op += 1
-                    m_pos += 1
-                    t -= 1
-                    if not t > 0: break
-            #emulate c switch
-            state = c_copy_match
-        
-        ##
-        if state == c_copy_match:
-            if not if_block:
-                t += 2
-                out = outBuf.require(t)
-                while True:
-                    out[op] = out[m_pos]
-                    op += 1
-                    m_pos += 1
-                    t -= 1
-                    if not t > 0: break
-            #emulating c switch
-            state = c_match_done
- 
-        ##
-        if state == c_match_done:
-            t = inBuf[ip - 2] & 3
-            if t == 0:
-                state = c_top_loop
+                    t, ip = _read_length(data, ip, t, 15)
+                t += 3
+                if op + t > size:
+                    raise ValueError('LZO: output overrun')
+                if ip + t > len(data):
+                    raise ValueError('LZO: input overrun')
+                out[op:op + t] = data[ip:ip + t]
+                op += t
+                ip += t
+                state = 4
                 continue
-            #emulate c switch
-            state = c_match_next
-
-        ##
-        if state == c_match_next:
-            out = outBuf.require(1)
-            out[op] = inBuf[ip]
-            op += 1
-            ip += 1
-            if t > 1:
-                out = outBuf.require(1)
-                out[op] = inBuf[ip]
-                op += 1
+            elif state != 4:
+                # 2 bytes match after short literals
+                next_state = t & 3
+                m_pos = op - 1 - (t >> 2) - (data[ip] << 2)
+                ip += 1
+                t = 2
+            else:
+                # 3 bytes match after literal run
+                next_state = t & 3
+                m_pos = op - 0x801 - (t >> 2) - (data[ip] << 2)
                 ip += 1
-                if t > 2:
-                    out = outBuf.require(1)
-                    out[op] = inBuf[ip]
-                    op += 1
-                    ip += 1
-            t = inBuf[ip]
+                t = 3
+        elif t >= 64:
+            next_state = t & 3
+            m_pos = op - 1 - ((t >> 2) & 7) - (data[ip] << 3)
             ip += 1
-            state = c_match
+            t = (t >> 5) + 1
+        elif t >= 32:
+            t = (t & 31) + 2
+            if t == 2:
+                t, ip = _read_length(data, ip, t, 31)
+            distance = data[ip] | (data[ip + 1] << 8)
+            ip += 2
+            m_pos = op - 1 - (distance >> 2)
+            next_state = distance & 3
+        else:
+            m_pos = op - ((t & 8) << 11)
+            t = (t & 7) + 2
+            if t == 2:
+                t, ip = _read_length(data, ip, t, 7)
+            distance = data[ip] | (data[ip + 1] << 8)
+            ip += 2
+            m_pos -= distance >> 2
+            next_state = distance & 3
+            # end of stream
+            if m_pos == op:
+                break
+            m_pos -= 0x4000
+
+        # copy match, it may overlap output
+        if m_pos < 0:
+            raise ValueError('LZO: lookbehind overrun')
+        end = op + t
+        if end > size:
+            raise ValueError('LZO: output overrun')
+        if op - m_pos >= t:
+            out[op:end] = out[m_pos:m_pos + t]
+        else:
+            # overlapped match repeats the last (op - m_pos) bytes
+            out[op:end] = (out[m_pos:op] * (t // (op - m_pos) + 1))[:t]
+        op = end
+
+        # 0 to 3 literals follow match
+        state = next_state
+        if state:
+            if op + state > size:
+                raise ValueError('LZO: output overrun')
+            if ip + state > len(data):
+                raise ValueError('LZO: input overrun')
+            out[op:op + state] = data[ip:ip + state]
+            op += state
+            ip += state
+
+    if op != size:
+        raise ValueError('LZO: decompressed size %d, expected %d' % (op, size))
+    return bytes(out)
+
+
+def decompress(data, size):
+    """decompress LZO1X data without header, size is the decompressed size"""
+    if _lzo is not None:
+        # python-lzo needs header of 0xf0 and decompressed size
+        return _lzo.decompress(b'\xf0' + pack('>I', size) + bytes(data))
+    try:
+        return _decompress(data, size)
+    except IndexError:
+        raise ValueError('LZO: input overrun')
+
+
+# LZO1X-1 compression
+M2_MAX_LEN = 8
+M2_MAX_OFFSET = 0x0800
+M3_MAX_LEN = 33
+M3_MAX_OFFSET = 0x4000
+M4_MAX_LEN = 9
+M4_MAX_OFFSET = 0xbfff
+M3_MARKER = 32
+M4_MARKER = 16
+
+
+def _literal_run(out, t):
+    """append literal run header of t literals, t > 3"""
+    if t <= 18:
+        out.append(t - 3)
+    else:
+        t -= 18
+        out.append(0)
+        while t > 255:
+            t -= 255
+            out.append(0)
+        out.append(t)
+
+
+def _length(out, marker, m_len, max_len):
+    """append match header with length, m_len > max_len uses extended length"""
+    if m_len <= max_len:
+        out.append(marker | (m_len - 2))
+    else:
+        m_len -= max_len
+        out.append(marker)
+        while m_len > 255:
+            m_len -= 255
+            out.append(0)
+        out.append(m_len)
+
+
+def _compress(data):
+    out = bytearray()
+    size = len(data)
+    # the last bytes are always literals
+    ip_end = size - 20
+    # last position of every 4 bytes
+    positions = {}
+    # start of literals
+    ii = 0
+    ip = 4
+    while ip < ip_end:
+        dv = data[ip:ip + 4]
+        m_pos = positions.get(dv)
+        positions[dv] = ip
+        if m_pos is None or ip - m_pos > M4_MAX_OFFSET:
+            # skip faster in incompressible data
+            ip += 1 + ((ip - ii) >> 5)
             continue
 
-    return bytes(outBuf.pack(op))
-
-def decompress(input, initSize = 16000, blockSize = 8192):
-    output = FlexBuffer()
-    output.alloc(initSize, blockSize)
-    return _decompress(bytearray(input), output)
-
-
+        # literals before match
+        t = ip - ii
+        if t:
+            if t <= 3:
+                # literals are counted in the last match
+                out[-2] |= t
+            else:
+                _literal_run(out, t)
+            out += data[ii:ip]
+
+        m_len = 4
+        max_len = size - ip
+        while m_len + 16 <= max_len and data[ip + m_len:ip + m_len + 16] == data[m_pos + m_len:m_pos + m_len + 16]:
+            m_len += 16
+        while m_len < max_len and data[ip + m_len] == data[m_pos + m_len]:
+            m_len += 1
+
+        m_off = ip - m_pos
+        ip += m_len
+        ii = ip
+        if m_len <= M2_MAX_LEN and m_off <= M2_MAX_OFFSET:
+            m_off -= 1
+            out.append(((m_len - 1) << 5) | ((m_off & 7) << 2))
+            out.append(m_off >> 3)
+        elif m_off <= M3_MAX_OFFSET:
+            m_off -= 1
+            _length(out, M3_MARKER, m_len, M3_MAX_LEN)
+            out.append((m_off << 2) & 0xff)
+            out.append(m_off >> 6)
+        else:
+            m_off -= 0x4000
+            _length(out, M4_MARKER | ((m_off >> 11) & 8), m_len, M4_MAX_LEN)
+            out.append((m_off << 2) & 0xff)
+            out.append((m_off >> 6) & 0xff)
+
+    # the last literals
+    t = size - ii
+    if t:
+        if not out and t <= 238:
+            out.append(17 + t)
+        elif t <= 3:
+            out[-2] |= t
+        else:
+            _literal_run(out, t)
+        out += data[ii:]
+    # end of stream
+    out += bytes([M4_MARKER | 1, 0, 0])
+    return bytes(out)
+
+
+def compress(data):
+    """LZO1X-1 compress data, without header"""
+    if _lzo is not None:
+        # python-lzo adds header of 0xf0 and decompressed size
+        return _lzo.compress(bytes(data), 1)[5:]
+    return _compress(bytes(data))
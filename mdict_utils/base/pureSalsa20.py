@@ -180,6 +180,12 @@ else:
 	integer_types = (int, long)
 	python3 = False
 
+# numpy computes many keystream blocks at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from struct import Struct
 little_u64 = Struct( "<Q" )      #    little-endian 64-bit unsigned.
                                  #    Unpacks to a tuple of one element!
@@ -251,6 +257,8 @@ class Salsa20(object):
         assert type(data) == bytes, 'data must be byte string'
         assert self._lastChunk64, 'previous chunk not multiple of 64 bytes'
         lendata = len(data)
+        if numpy is not None and python3:
+            return self._encryptBytesBatched(data)
         munged = bytearray(lendata)
         for i in range( 0, lendata, 64 ):
             h = salsa20_wordtobyte( self.ctx, self.rounds, checkRounds=False )
@@ -267,6 +275,20 @@ class Salsa20(object):
     
     decryptBytes = encryptBytes # encrypt and decrypt use same function
 
+    def _encryptBytesBatched(self, data, batchBlocks=16384):
+        """ encryptBytes() with keystream of batchBlocks blocks computed at once by numpy.
+            """
+        lendata = len(data)
+        munged = numpy.frombuffer(data, dtype=numpy.uint8).copy()
+        for i in range( 0, lendata, 64 * batchBlocks ):
+            nBlocks = min( batchBlocks, ( lendata - i + 63 ) // 64 )
+            h = salsa20_keystream( self.ctx, self.rounds, nBlocks )
+            self.setCounter( ( self.getCounter() + nBlocks ) % 2**64 )
+            end = min( lendata, i + 64 * nBlocks )
+            munged[ i:end ] ^= h[ :end - i ]
+        self._lastChunk64 = not lendata % 64
+        return munged.tobytes()
+
 #--------------------------------------------------------------------------
 
 def salsa20_wordtobyte( input, nRounds=20, checkRounds=True ):
@@ -325,6 +347,44 @@ def salsa20_wordtobyte( input, nRounds=20, checkRounds=True ):
         x[i] = PLUS( x[i], input[i] )
     return little16_i32.pack( *x )
 
+# Salsa20 quarter round steps of salsa20_wordtobyte(), x[a] ^= ROTATE(PLUS(x[b], x[c]), n)
+_ROUND_STEPS = (
+    # column round
+    ( 4, 0,12, 7), ( 8, 4, 0, 9), (12, 8, 4,13), ( 0,12, 8,18),
+    ( 9, 5, 1, 7), (13, 9, 5, 9), ( 1,13, 9,13), ( 5, 1,13,18),
+    (14,10, 6, 7), ( 2,14,10, 9), ( 6, 2,14,13), (10, 6, 2,18),
+    ( 3,15,11, 7), ( 7, 3,15, 9), (11, 7, 3,13), (15,11, 7,18),
+    # row round
+    ( 1, 0, 3, 7), ( 2, 1, 0, 9), ( 3, 2, 1,13), ( 0, 3, 2,18),
+    ( 6, 5, 4, 7), ( 7, 6, 5, 9), ( 4, 7, 6,13), ( 5, 4, 7,18),
+    (11,10, 9, 7), ( 8,11,10, 9), ( 9, 8,11,13), (10, 9, 8,18),
+    (12,15,14, 7), (13,12,15, 9), (14,13,12,13), (15,14,13,18),
+)
+
+
+def salsa20_keystream( input, nRounds, nBlocks ):
+    """ Keystream of nBlocks blocks from state input with block counter
+            input[8], input[9], then counter + 1, ... as numpy uint8 array.
+        Every state word of all blocks is one numpy uint32 array,
+            so blocks are computed at once.
+        """
+    assert( type(input) in ( list, tuple )  and  len(input) == 16 )
+    state = [ numpy.full( nBlocks, w & 0xffffFFFF, dtype=numpy.uint32 ) for w in input ]
+    counter = ( input[8] & 0xffffFFFF ) | ( input[9] & 0xffffFFFF ) << 32
+    counters = numpy.arange( nBlocks, dtype=numpy.uint64 ) + numpy.uint64( counter )
+    state[8] = ( counters & numpy.uint64( 0xffffFFFF ) ).astype( numpy.uint32 )
+    state[9] = ( counters >> numpy.uint64( 32 ) ).astype( numpy.uint32 )
+
+    x = [ w.copy() for w in state ]
+    for i in range( nRounds // 2 ):
+        for a, b, c, n in _ROUND_STEPS:
+            t = x[b] + x[c]
+            x[a] ^= ( t << n ) | ( t >> ( 32 - n ) )
+    for i in range( 16 ):
+        x[i] += state[i]
+    # little-endian words of block after block
+    return numpy.stack( x, axis=1 ).astype( '<u4' ).view( numpy.uint8 ).reshape( -1 )
+
 #--------------------------- 32-bit ops -------------------------------
 
 def trunc32( w ):
@@ -17,21 +17,27 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 # GNU General Public License for more details.
 
-from struct import pack, unpack
+from struct import pack, unpack, unpack_from, calcsize
 from io import BytesIO
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from functools import lru_cache, partial
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import os
 import re
+import string
 import sys
 
-from .ripemd128 import ripemd128
+from .ripemd128 import ripemd128 as _ripemd128
 from .pureSalsa20 import Salsa20
+from . import sidecar
 
 # zlib compression is used for engine version >=2.0
 import zlib
-# LZO compression is used for engine version < 2.0
-try:
-    import lzo
-except ImportError:
-    lzo = None
+# LZO compression is used for engine version < 2.0, python-lzo is used if it is installed
+from . import lzo
 
 # xxhash is used for engine version >= 3.0
 try:
@@ -39,6 +45,12 @@ try:
 except ImportError:
     xxhash = None
 
+# numpy is used to locate many offsets at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # 2x3 compatible
 if sys.hexversion >= 0x03000000:
     unicode = str
@@ -55,19 +67,33 @@ def _unescape_entities(text):
     return text
 
 
+# swap high and low 4 bits of byte
+_NIBBLE_SWAP = bytes(((i >> 4) | (i << 4)) & 0xff for i in range(256))
+_BYTE_INDEX = bytes(range(256))
+
+
 def _fast_decrypt(data, key):
     """
     XOR decryption
+
+    plain[i] = swap(cipher[i]) ^ cipher[i - 1] ^ (i & 0xff) ^ key[i % len(key)], cipher[-1] is 0x36.
+    the previous byte is ciphertext, so all bytes are decrypted at once.
     """
-    b = bytearray(data)
-    key = bytearray(key)
-    previous = 0x36
-    for i in range(len(b)):
-        t = (b[i] >> 4 | b[i] << 4) & 0xff
-        t = t ^ previous ^ (i & 0xff) ^ key[i % len(key)]
-        previous = b[i]
-        b[i] = t
-    return bytes(b)
+    data = bytes(data)
+    size = len(data)
+    if not size:
+        return b''
+    # XOR of byte strings as big integers
+    streams = [
+        data.translate(_NIBBLE_SWAP),
+        b'\x36' + data[:-1],
+        (_BYTE_INDEX * (size // 256 + 1))[:size],
+        (bytes(key) * (size // len(key) + 1))[:size],
+    ]
+    plain = 0
+    for stream in streams:
+        plain ^= int.from_bytes(stream, 'big')
+    return plain.to_bytes(size, 'big')
 
 
 def _salsa_decrypt(ciphertext, encrypt_key):
@@ -85,17 +111,244 @@ def _decrypt_regcode_by_userid(reg_code, userid):
     return encrypt_key
 
 
+@lru_cache(maxsize=256)
+def ripemd128(message):
+    """
+    ripemd128 digest, cached. encryption key of every block is derived from its checksum.
+    """
+    return _ripemd128(message)
+
+
+def _decode_block_data(block, decompressed_size, version, encrypted_key=None):
+    """
+    decode key or record block of MDict engine version.
+    encrypted_key is derived from passcode or UUID, else from checksum of block.
+    """
+    # block info: compression, encryption
+    info = unpack('<L', block[:4])[0]
+    compression_method = info & 0xf
+    encryption_method = (info >> 4) & 0xf
+    encryption_size = (info >> 8) & 0xff
+
+    # adler checksum of the block data used as the encryption key if none given
+    adler32 = unpack('>I', block[4:8])[0]
+    if encrypted_key is None and encryption_method != 0:
+        encrypted_key = ripemd128(bytes(block[4:8]))
+
+    # block data
+    data = block[8:]
+
+    # decrypt
+    if encryption_method == 0:
+        decrypted_block = data
+    elif encryption_method == 1:
+        decrypted_block = _fast_decrypt(data[:encryption_size], encrypted_key) + data[encryption_size:]
+    elif encryption_method == 2:
+        decrypted_block = _salsa_decrypt(data[:encryption_size], encrypted_key) + data[encryption_size:]
+    else:
+        raise Exception('encryption method %d not supported' % encryption_method)
+
+    # check adler checksum over decrypted data
+    if version >= 3:
+        assert(hex(adler32) == hex(zlib.adler32(decrypted_block) & 0xffffffff))
+
+    # decompress
+    if compression_method == 0:
+        decompressed_block = decrypted_block
+    elif compression_method == 1:
+        decompressed_block = lzo.decompress(decrypted_block, decompressed_size)
+    elif compression_method == 2:
+        decompressed_block = zlib.decompress(decrypted_block)
+    else:
+        raise Exception('compression method %d not supported' % compression_method)
+
+    # check adler checksum over decompressed data
+    if version < 3:
+        assert(hex(adler32) == hex(zlib.adler32(decompressed_block) & 0xffffffff))
+
+    return decompressed_block
+
+
+def _split_key_block_data(key_block, encoding, number_format):
+    """
+    split decompressed key block into (record offsets, key text starts, key texts) like _KeyList.
+    key text starts are counted from the first key text of this block, the first one is 0.
+    """
+    number_width = calcsize(number_format)
+    # key text ends with '\x00'
+    if encoding == 'UTF-16':
+        delimiter = b'\x00\x00'
+        width = 2
+    else:
+        delimiter = b'\x00'
+        width = 1
+    size = len(key_block)
+    find = key_block.find
+    offsets = []
+    key_texts = []
+    key_start_index = 0
+    while key_start_index < size:
+        # the corresponding record's offset in record block
+        offsets.append(unpack_from(number_format, key_block, key_start_index)[0])
+        text_start_index = key_start_index + number_width
+        key_end_index = find(delimiter, text_start_index)
+        # UTF-16 delimiter is aligned to character
+        while width == 2 and key_end_index != -1 and (key_end_index - text_start_index) % 2:
+            key_end_index = find(delimiter, key_end_index + 1)
+        if key_end_index == -1:
+            key_end_index = size
+        key_texts.append(key_block[text_start_index:key_end_index].decode(encoding, errors='ignore'))
+        key_start_index = key_end_index + width
+    # key texts are converted to UTF-8 at once, whitespace is stripped as _decode_key_text
+    key_texts = [key_text.encode('utf-8').strip() for key_text in key_texts]
+    key_starts = array('Q', [0])
+    key_starts.extend(accumulate(map(len, key_texts)))
+    return array('Q', offsets), key_starts, b''.join(key_texts)
+
+
+def _decode_key_text(key_text, encoding):
+    return key_text.decode(encoding, errors='ignore').encode('utf-8').strip()
+
+
+def _decode_key_block_data(block, decompressed_size, version, encrypted_key, encoding, number_format):
+    """
+    decode one key block into (record offsets, key text starts, key texts).
+    it runs in worker process, so arguments and result are plain data.
+    """
+    return _split_key_block_data(
+        _decode_block_data(block, decompressed_size, version, encrypted_key), encoding, number_format)
+
+
+# punctuation is ignored when sorting keys with StripKey="Yes"
+_regex_strip = re.compile('[%s ]+' % string.punctuation)
+
+
+# key index sidecar file (*.mdx.idx, *.mdd.idx), see sidecar module for header
+#   numbers: entry count, record block offset, record index offset, key count, key data size,
+#     key order, which is 0 not checked, 1 keys follow _sort_key order, 2 they do not
+#   record offset of every key    (count * uint64)
+#   start of every key text       ((count + 1) * uint64)
+#   key text                      (UTF-8, concatenated)
+_KEY_INDEX_MAGIC = b'MDXIDX02'
+
+
+def _searchsorted(a, values, side='left'):
+    """
+    bisect every value in sorted uint64 array a, vectorized by numpy if it is available.
+    """
+    if numpy is not None and len(values) > 1 and len(a) > 0:
+        return numpy.searchsorted(
+            numpy.frombuffer(a, dtype=numpy.uint64),
+            numpy.asarray(values, dtype=numpy.uint64), side).tolist()
+    bisect = bisect_left if side == 'left' else bisect_right
+    return [bisect(a, value) for value in values]
+
+
+class _KeyList(object):
+    """
+    Read-only sequence of (record offset, key text) tuples backed by flat buffers.
+    record offsets and key text starts are uint64 arrays, key texts are concatenated.
+    """
+    def __init__(self, offsets, key_starts, key_data):
+        self._offsets = offsets
+        self._key_starts = key_starts
+        self._key_data = key_data
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        build from iterable of (record offsets, key text starts, key texts), such as every key block.
+        key text starts of every part are counted from its first key text.
+        """
+        offsets = array('Q')
+        key_starts = array('Q', [0])
+        key_data = bytearray()
+        for part_offsets, part_key_starts, part_key_data in parts:
+            offsets.extend(part_offsets)
+            # shift starts by size of key texts before the part
+            key_starts.extend(map(len(key_data).__add__, part_key_starts[1:]))
+            key_data += part_key_data
+        return cls(offsets, key_starts, key_data)
+
+    def searchsorted(self, offsets):
+        """
+        Return the position of the first key whose record offset is not less than offset,
+        for every offset.
+        """
+        return _searchsorted(self._offsets, offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self._offsets[index], \
+            bytes(self._key_data[self._key_starts[index]:self._key_starts[index + 1]])
+
+    def __iter__(self):
+        key_data = self._key_data
+        key_starts = self._key_starts
+        for i, offset in enumerate(self._offsets):
+            yield offset, bytes(key_data[key_starts[i]:key_starts[i + 1]])
+
+
+class _SortedKeyIndex(object):
+    """
+    Key index of sorted key list, such as the one mapped from sidecar index file.
+    Keys are looked up by binary search, so no dict is built over every key.
+    """
+    def __init__(self, md):
+        self._md = md
+
+    def get(self, key, default=None):
+        """index of key, list of indexes for duplicate key. like dict of MDict._key_index"""
+        key_list = self._md._key_list
+        sort_key = self._md._sort_key(key)
+        result = []
+        for x in range(self._md._bisect_keys(sort_key), len(key_list)):
+            key_text = key_list[x][1]
+            if self._md._sort_key(key_text) != sort_key:
+                break
+            if key_text == key:
+                result.append(x)
+        if not result:
+            return default
+        return result[0] if len(result) == 1 else result
+
+
+class _KeyOrderError(Exception):
+    """keys of key block do not follow the sort order"""
+
+
 class MDict(object):
     """
     Base class which reads in header and key block.
     It has no public methods and serves only as code sharing base class.
     """
-    def __init__(self, fname, encoding='', passcode=None):
+    def __init__(self, fname, encoding='', passcode=None, index=False, lazy=False, workers=None):
         self._fname = fname
+        # number of processes to decode key blocks
+        self._workers = workers
         self._encoding = encoding.upper()
         self._encrypted_key = None
+        self._lazy = False
+        self._key_list = None
+        self._key_index = None
+        # key list is read from or saved to sidecar index file
+        self._index = index
+        # keys follow _sort_key order, None if it is not checked
+        self._key_order = None
+        self._record_block_index = None
+        # file content, such as mmap kept by reader.Dictionary. file is opened to read if it is None
+        self._buf = None
 
         self.header = self._read_header()
+        # (size, mtime, header checksum) of file when it is opened,
+        # sidecar files and cached record blocks belong to it
+        self._source_stat = sidecar.source_stat(fname, self._header_checksum)
 
         # decrypt regcode to get the encrypted key
         if passcode is not None:
@@ -112,7 +365,27 @@ class MDict(object):
                 mid = (len(uuid) + 1) // 2
                 self._encrypted_key = xxhash.xxh64_digest(uuid[:mid]) + xxhash.xxh64_digest(uuid[mid:])
 
-        self._key_list = self._read_keys()
+        # load keys from sidecar index file if it is valid, else build it
+        key_list = None
+        if index:
+            key_list = self._load_key_index()
+        # lazy mode only reads key block info, key blocks are decoded on demand
+        if key_list is None and lazy:
+            self._lazy = self._read_key_block_index()
+        if key_list is None and not self._lazy:
+            self._key_list = self._read_keys()
+            if index:
+                self._save_key_index()
+        elif key_list is not None:
+            self._key_list = key_list
+
+    def _ensure_key_list(self):
+        """
+        Return full key list, in lazy mode it is read at first use.
+        """
+        if self._key_list is None:
+            self._key_list = self._read_keys()
+        return self._key_list
 
     def __len__(self):
         return self._num_entries
@@ -124,7 +397,175 @@ class MDict(object):
         """
         Return an iterator over dictionary keys.
         """
-        return (key_value for key_id, key_value in self._key_list)
+        return (key_value for key_id, key_value in self._ensure_key_list())
+
+    def _lookup_key(self, key):
+        """
+        Return list of (record offset, record length) of key, length is -1 for the last record.
+        """
+        if self._lazy:
+            try:
+                result = self._lookup_key_lazy(key)
+                # found keys are right, but binary search over key blocks misses keys which are
+                # out of order, so missing key is trusted only if key order is known
+                if result or self._key_order:
+                    return result
+            except _KeyOrderError:
+                pass
+            self._leave_lazy()
+        key_list = self._ensure_key_list()
+        x = self._ensure_key_index().get(key)
+        if x is None:
+            return []
+        result = []
+        for x in ([x] if isinstance(x, int) else x):
+            offset = key_list[x][0]
+            if (x + 1) < len(key_list):
+                length = key_list[x + 1][0] - offset
+            else:
+                length = -1
+            result.append((offset, length))
+        return result
+
+    def _ensure_key_index(self):
+        """
+        Return key index, it is built at first use. With sidecar index file, sorted keys are
+        looked up by binary search, else dict is built over every key.
+        """
+        if self._key_index is None:
+            if self._index and self._keys_sorted():
+                self._key_index = _SortedKeyIndex(self)
+            else:
+                self._key_index = self._build_key_index()
+        return self._key_index
+
+    def _build_key_index(self, normalize=None):
+        """
+        Return dict of key text to position in key list, list of positions for duplicate key.
+
+        normalize: function of key text, dict is keyed by its result if it is set
+        """
+        key_index = {}
+        for x, (key_id, key_text) in enumerate(self._ensure_key_list()):
+            if normalize is not None:
+                key_text = normalize(key_text)
+            y = key_index.setdefault(key_text, x)
+            if y == x:
+                continue
+            if isinstance(y, int):
+                key_index[key_text] = [y, x]
+            else:
+                y.append(x)
+        return key_index
+
+    def _keys_sorted(self):
+        """
+        Return True if keys in file follow _sort_key order, binary search depends on it.
+        Some writers sort keys differently from the header, it is checked once.
+        """
+        if self._key_order is None:
+            self._key_order = True
+            last = None
+            for key_id, key_text in self._ensure_key_list():
+                sort_key = self._sort_key(key_text)
+                if last is not None and sort_key < last:
+                    self._key_order = False
+                    break
+                last = sort_key
+        return self._key_order
+
+    def _bisect_keys(self, sort_key):
+        """
+        Return position of the first key whose sort key is not less than sort_key, keys must be sorted.
+        """
+        key_list = self._ensure_key_list()
+        lo, hi = 0, len(key_list)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._sort_key(key_list[mid][1]) < sort_key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _scan_keys(self, start, match):
+        """
+        Yield (key text, record offset, record length) of keys whose sort key is not less than
+        start and matches. Record length is -1 for the last record.
+
+        match: function of sort key. Sorted keys are yielded in key order until the first key
+        which does not match, else all keys are filtered in file order.
+        """
+        # keys which are yielded in lazy mode before unsorted key block is found
+        skip = range(0)
+        if self._lazy and not self._key_order:
+            self._leave_lazy()
+        if self._lazy:
+            first = None
+            count = 0
+            try:
+                for x, key_text, offset, length in self._scan_keys_lazy(start, match):
+                    if first is None:
+                        first = x
+                    count += 1
+                    yield key_text, offset, length
+                return
+            except _KeyOrderError:
+                if first is not None:
+                    skip = range(first, first + count)
+                self._leave_lazy()
+
+        key_list = self._ensure_key_list()
+        sorted_keys = self._keys_sorted()
+        lo = self._bisect_keys(start) if sorted_keys else 0
+        for x in range(lo, len(key_list)):
+            if x in skip:
+                continue
+            offset, key_text = key_list[x]
+            sort_key = self._sort_key(key_text)
+            if sort_key < start or not match(sort_key):
+                if sorted_keys:
+                    break
+                continue
+            if (x + 1) < len(key_list):
+                length = key_list[x + 1][0] - offset
+            else:
+                length = -1
+            yield key_text, offset, length
+
+    def _scan_keys_lazy(self, start, match):
+        """
+        Yield (position in key list, key text, record offset, record length) like _scan_keys.
+        Raise _KeyOrderError if a key block is not sorted.
+        """
+        x = bisect_left(self._key_block_tail_index, start)
+        index = sum(self._key_block_entries[:x])
+        last = None
+        while x < len(self._key_block_index):
+            for offset, key_text in self._get_key_block(x):
+                if last is not None:
+                    yield last[0], last[1], last[2], offset - last[2]
+                    last = None
+                sort_key = self._sort_key(key_text)
+                if sort_key >= start:
+                    if not match(sort_key):
+                        return
+                    last = index, key_text, offset
+                index += 1
+            x += 1
+        if last is not None:
+            yield last[0], last[1], last[2], -1
+
+    def _sort_key(self, key):
+        """
+        key text in the order of key blocks, follow KeyCaseSensitive and StripKey in header
+        """
+        key = key.decode('utf-8', errors='ignore')
+        if self.header.get(b'KeyCaseSensitive') != b'Yes':
+            key = key.lower()
+        if (self.header.get(b'StripKey') or self.header.get(b'Stripkey')) == b'Yes':
+            key = _regex_strip.sub('', key)
+        return key
 
     def _read_number(self, f):
         return unpack(self._number_format, f.read(self._number_width))[0]
@@ -143,54 +584,8 @@ class MDict(object):
         return tagdict
 
     def _decode_block(self, block, decompressed_size):
-        # block info: compression, encryption
-        info = unpack('<L', block[:4])[0]
-        compression_method =  info & 0xf
-        encryption_method = (info >> 4) & 0xf
-        encryption_size = (info >> 8) & 0xff
-
-        # adler checksum of the block data used as the encryption key if none given
-        adler32 = unpack('>I', block[4:8])[0]
-        encrypted_key = self._encrypted_key
-        if encrypted_key is None:
-            encrypted_key = ripemd128(block[4:8])
-
-        # block data
-        data = block[8:]
-
-        # decrypt
-        if encryption_method == 0:
-            decrypted_block = data
-        elif encryption_method == 1:
-            decrypted_block = _fast_decrypt(data[:encryption_size], encrypted_key) + data[encryption_size:]
-        elif encryption_method == 2:
-            decrypted_block = _salsa_decrypt(data[:encryption_size], encrypted_key) + data[encryption_size:]
-        else:
-            raise Exception('encryption method %d not supported' % encryption_method)
-
-        # check adler checksum over decrypted data
-        if self._version >= 3:
-            assert(hex(adler32) == hex(zlib.adler32(decrypted_block) & 0xffffffff))
-
-        # decompress
-        if compression_method == 0:
-            decompressed_block = decrypted_block
-        elif compression_method == 1:
-            if lzo is None:
-                raise RuntimeError("LZO compression is not supported")
-            header = b'\xf0' + pack('>I', decompressed_size)
-            decompressed_block = lzo.decompress(header + decrypted_block)
-        elif compression_method == 2:
-            decompressed_block = zlib.decompress(decrypted_block)
-        else:
-            raise Exception('compression method %d not supported' % compression_method)
+        return _decode_block_data(block, decompressed_size, self._version, self._encrypted_key)
 
-        # check adler checksum over decompressed data
-        if self._version < 3:
-            assert(hex(adler32) == hex(zlib.adler32(decompressed_block) & 0xffffffff))
-
-        return decompressed_block
-    
     def _decode_key_block_info(self, key_block_info_compressed):
         if self._version >= 2:
             # zlib compression
@@ -209,6 +604,10 @@ class MDict(object):
             key_block_info = key_block_info_compressed
         # decode
         key_block_info_list = []
+        # first and last key, entries number of every key block
+        self._key_block_heads = []
+        self._key_block_tails = []
+        self._key_block_entries = []
         num_entries = 0
         i = 0
         if self._version >= 2:
@@ -222,23 +621,29 @@ class MDict(object):
 
         while i < len(key_block_info):
             # number of entries in current key block
-            num_entries += unpack(self._number_format, key_block_info[i:i+self._number_width])[0]
+            block_entries = unpack(self._number_format, key_block_info[i:i+self._number_width])[0]
+            num_entries += block_entries
+            self._key_block_entries.append(block_entries)
             i += self._number_width
             # text head size
             text_head_size = unpack(byte_format, key_block_info[i:i+byte_width])[0]
             i += byte_width
             # text head
             if self._encoding != 'UTF-16':
+                self._key_block_heads.append(self._decode_key_text(key_block_info[i:i+text_head_size]))
                 i += text_head_size + text_term
             else:
+                self._key_block_heads.append(self._decode_key_text(key_block_info[i:i+text_head_size*2]))
                 i += (text_head_size + text_term) * 2
             # text tail size
             text_tail_size = unpack(byte_format, key_block_info[i:i+byte_width])[0]
             i += byte_width
             # text tail
             if self._encoding != 'UTF-16':
+                self._key_block_tails.append(self._decode_key_text(key_block_info[i:i+text_tail_size]))
                 i += text_tail_size + text_term
             else:
+                self._key_block_tails.append(self._decode_key_text(key_block_info[i:i+text_tail_size*2]))
                 i += (text_tail_size + text_term) * 2
             # key block compressed size
             key_block_compressed_size = unpack(self._number_format, key_block_info[i:i+self._number_width])[0]
@@ -253,39 +658,34 @@ class MDict(object):
         return key_block_info_list
 
     def _decode_key_block(self, key_block_compressed, key_block_info_list):
-        key_list = []
+        blocks = []
         i = 0
         for compressed_size, decompressed_size in key_block_info_list:
-            key_block = self._decode_block(key_block_compressed[i:i+compressed_size], decompressed_size)
-            # extract one single key block into a key list
-            key_list += self._split_key_block(key_block)
+            blocks.append((key_block_compressed[i:i+compressed_size], decompressed_size))
             i += compressed_size
-        return key_list
+        return self._decode_key_blocks(blocks)
+
+    def _decode_key_blocks(self, blocks):
+        """
+        decode list of (compressed key block, decompressed size) into one key list.
+        blocks are decoded in processes if workers is given, splitting keys holds GIL of thread.
+        workers return flat arrays of every block, they are joined in block order.
+        """
+        decode = partial(_decode_key_block_data, version=self._version, encrypted_key=self._encrypted_key,
+                         encoding=self._encoding, number_format=self._number_format)
+        if self._workers and self._workers > 1 and len(blocks) > 1:
+            # some blocks in every task, pickling overhead of small blocks is shared
+            chunksize = max(1, len(blocks) // (self._workers * 4))
+            with ProcessPoolExecutor(self._workers) as executor:
+                return _KeyList.concat(executor.map(decode, *zip(*blocks), chunksize=chunksize))
+        return _KeyList.concat(decode(*block) for block in blocks)
 
     def _split_key_block(self, key_block):
-        key_list = []
-        key_start_index = 0
-        while key_start_index < len(key_block):
-            # the corresponding record's offset in record block
-            key_id = unpack(self._number_format, key_block[key_start_index:key_start_index+self._number_width])[0]
-            # key text ends with '\x00'
-            if self._encoding == 'UTF-16':
-                delimiter = b'\x00\x00'
-                width = 2
-            else:
-                delimiter = b'\x00'
-                width = 1
-            i = key_start_index + self._number_width
-            while i < len(key_block):
-                if key_block[i:i+width] == delimiter:
-                    key_end_index = i
-                    break
-                i += width
-            key_text = key_block[key_start_index+self._number_width:key_end_index]\
-                .decode(self._encoding, errors='ignore').encode('utf-8').strip()
-            key_start_index = key_end_index + width
-            key_list += [(key_id, key_text)]
-        return key_list
+        """return list of (record offset, key text) of decompressed key block"""
+        return list(_KeyList(*_split_key_block_data(key_block, self._encoding, self._number_format)))
+
+    def _decode_key_text(self, key_text):
+        return _decode_key_text(key_text, self._encoding)
 
     def _read_header(self):
         f = open(self._fname, 'rb')
@@ -295,6 +695,7 @@ class MDict(object):
         # 4 bytes: adler32 checksum of header, in little endian
         adler32 = unpack('<I', f.read(4))[0]
         assert(adler32 == zlib.adler32(header_bytes) & 0xffffffff)
+        self._header_checksum = adler32
         # mark down key block offset
         self._key_block_offset = f.tell()
         f.close()
@@ -398,13 +799,12 @@ class MDict(object):
         f.seek(self._key_data_offset)
         number = self._read_int32(f)
         total_size = self._read_number(f)
-        key_list = []
+        blocks = []
         for i in range(number):
             decompressed_size = self._read_int32(f)
             compressed_size = self._read_int32(f)
-            block_data = f.read(compressed_size)
-            decompressed_block_data = self._decode_block(block_data, decompressed_size)
-            key_list.extend(self._split_key_block(decompressed_block_data))
+            blocks.append((f.read(compressed_size), decompressed_size))
+        key_list = self._decode_key_blocks(blocks)
 
         f.close()
         self._num_entries = len(key_list)
@@ -412,6 +812,22 @@ class MDict(object):
 
     def _read_keys_v1v2(self):
         f = open(self._fname, 'rb')
+        key_block_info_list, key_block_size = self._read_key_block_info_v1v2(f)
+
+        # read key block
+        key_block_compressed = f.read(key_block_size)
+        # extract key block
+        key_list = self._decode_key_block(key_block_compressed, key_block_info_list)
+
+        self._record_block_offset = f.tell()
+        f.close()
+
+        return key_list
+
+    def _read_key_block_info_v1v2(self, f):
+        """
+        read key block info, leave f at the beginning of key blocks
+        """
         f.seek(self._key_block_offset)
 
         # the following numbers could be encrypted
@@ -447,17 +863,99 @@ class MDict(object):
         key_block_info = f.read(key_block_info_size)
         key_block_info_list = self._decode_key_block_info(key_block_info)
         assert(num_key_blocks == len(key_block_info_list))
+        return key_block_info_list, key_block_size
 
-        # read key block
-        key_block_compressed = f.read(key_block_size)
-        # extract key block
-        key_list = self._decode_key_block(key_block_compressed, key_block_info_list)
-
-        self._record_block_offset = f.tell()
-        f.close()
+    def _read_key_block_index(self):
+        """
+        read key block info as sparse index of key blocks for lazy mode.
+        return False if keys could not be located by key block info.
+        """
+        if self._version >= 3 or (self._encrypt & 0x01 and self._encrypted_key is None):
+            return False
+        with open(self._fname, 'rb') as f:
+            key_block_info_list, key_block_size = self._read_key_block_info_v1v2(f)
+            key_block_start = f.tell()
+        self._record_block_offset = key_block_start + key_block_size
+
+        heads = [self._sort_key(key) for key in self._key_block_heads]
+        tails = [self._sort_key(key) for key in self._key_block_tails]
+        # key blocks must follow the sort order
+        for x in range(len(heads)):
+            if heads[x] > tails[x] or (x > 0 and tails[x - 1] > heads[x]):
+                return False
+        self._key_block_head_index = heads
+        self._key_block_tail_index = tails
+
+        self._key_block_index = []
+        offset = key_block_start
+        for compressed_size, decompressed_size in key_block_info_list:
+            self._key_block_index.append((offset, compressed_size, decompressed_size))
+            offset += compressed_size
+        self._key_block_cache = OrderedDict()
+        self._key_block_cache_size = 16
+        return True
 
+    def _get_key_block(self, index):
+        """
+        return key list of key block, recently used key blocks are cached.
+        """
+        key_list = self._key_block_cache.get(index)
+        if key_list is not None:
+            self._key_block_cache.move_to_end(index)
+            return key_list
+        offset, compressed_size, decompressed_size = self._key_block_index[index]
+        if self._buf is None:
+            with open(self._fname, 'rb') as f:
+                f.seek(offset)
+                block = f.read(compressed_size)
+        else:
+            block = self._buf[offset:offset + compressed_size]
+        key_list = self._split_key_block(self._decode_block(block, decompressed_size))
+        # block heads and tails are checked in _read_key_block_index, keys in block are checked here.
+        # key blocks which are never decoded are not checked, so missing keys and scans do not
+        # depend on binary search over key blocks unless key order is known
+        sort_keys = [self._sort_key(key_text) for offset, key_text in key_list]
+        if any(sort_keys[x] > sort_keys[x + 1] for x in range(len(sort_keys) - 1)):
+            # binary search over key blocks does not work, use the full key list
+            self._lazy = False
+            self._key_order = False
+            raise _KeyOrderError('keys of key block %d are not sorted' % index)
+        self._key_block_cache[index] = key_list
+        if len(self._key_block_cache) > self._key_block_cache_size:
+            self._key_block_cache.popitem(last=False)
         return key_list
 
+    def _leave_lazy(self):
+        """
+        Read full key list and stop lazy mode, keys are not located by key block info then.
+        With index, key list and key order are saved to sidecar index file for next open.
+        """
+        self._lazy = False
+        self._ensure_key_list()
+        if self._index:
+            self._save_key_index()
+
+    def _lookup_key_lazy(self, key):
+        sort_key = self._sort_key(key)
+        result = []
+        # the same sort key may cross key blocks
+        x = bisect_left(self._key_block_tail_index, sort_key)
+        while x < len(self._key_block_index) and self._key_block_head_index[x] <= sort_key:
+            key_list = self._get_key_block(x)
+            for y in range(len(key_list)):
+                offset, key_text = key_list[y]
+                if key != key_text:
+                    continue
+                if (y + 1) < len(key_list):
+                    length = key_list[y + 1][0] - offset
+                elif (x + 1) < len(self._key_block_index):
+                    length = self._get_key_block(x + 1)[0][0] - offset
+                else:
+                    length = -1
+                result.append((offset, length))
+            x += 1
+        return result
+
     def _read_keys_brutal(self):
         f = open(self._fname, 'rb')
         f.seek(self._key_block_offset)
@@ -503,29 +1001,108 @@ class MDict(object):
         self._num_entries = len(key_list)
         return key_list
 
-    def items(self):
+    def _key_index_fname(self):
+        return self._fname + '.idx'
+
+    def _load_key_index(self):
+        """
+        map key list from sidecar index file.
+        return None if index file is missing or out of date.
+        """
+        def layout(numbers):
+            num_entries, record_block_offset, record_index_offset, count, key_data_size, \
+                key_order = numbers
+            return [(count * 8, 'Q'), ((count + 1) * 8, 'Q'), (key_data_size, None)]
+
+        result = sidecar.load(self._key_index_fname(), _KEY_INDEX_MAGIC, self._source_stat, layout)
+        if result is None:
+            return None
+        (num_entries, record_block_offset, record_index_offset, count, key_data_size,
+            key_order), parts = result
+
+        self._num_entries = num_entries
+        self._record_block_offset = record_block_offset
+        if key_order:
+            self._key_order = key_order == 1
+        if record_index_offset:
+            self._record_index_offset = record_index_offset
+        return _KeyList(*parts)
+
+    def _save_key_index(self):
+        key_list = self._key_list
+        try:
+            sidecar.save(self._key_index_fname(), _KEY_INDEX_MAGIC, self._source_stat, [
+                self._num_entries, self._record_block_offset,
+                getattr(self, '_record_index_offset', 0),
+                len(key_list._offsets), len(key_list._key_data),
+                1 if self._keys_sorted() else 2,
+            ], [key_list._offsets, key_list._key_starts, key_list._key_data])
+        except OSError:
+            # index file is optional, such as read only directory
+            pass
+
+    def items(self, workers=None):
         """Return a generator which in turn produce tuples in the form of (filename, content)
+
+        workers: number of threads to decode record blocks, records are still in key order
         """
-        return self._read_records()
+        return self._read_records(workers)
 
-    def _read_records(self):
+    def _read_records(self, workers=None):
         if self._version >= 3:
-            yield from self._read_records_v3()
+            blocks = self._read_record_blocks_v3()
+        else:
+            blocks = self._read_record_blocks_v1v2()
+        if workers and workers > 1:
+            record_blocks = self._decode_record_blocks(blocks, workers)
         else:
-            yield from self._read_records_v1v2()
+            record_blocks = (self._decode_block(block, decompressed_size)
+                             for block, decompressed_size in blocks)
 
-    def _read_records_v3(self):
+        key_list = self._ensure_key_list()
+        offset = 0
+        i = 0
+        for record_block in record_blocks:
+            # split record block according to the offset info from key block
+            block_end = offset + len(record_block)
+            # keys whose record starts in current record block
+            j = key_list.searchsorted([block_end])[0]
+            for x in range(i, j):
+                record_start, key_text = key_list[x]
+                # record end index
+                if x < len(key_list)-1:
+                    record_end = key_list[x+1][0]
+                else:
+                    record_end = block_end
+                data = record_block[record_start-offset:record_end-offset]
+                yield key_text, self._treat_record_data(data)
+            i = j
+            offset = block_end
 
+    def _decode_record_blocks(self, blocks, workers):
+        """
+        decode record blocks in threads and yield them in file order.
+        zlib releases GIL. at most 2 blocks per worker are waiting in memory.
+        """
+        pending = deque()
+        with ThreadPoolExecutor(workers) as executor:
+            for block, decompressed_size in blocks:
+                pending.append(executor.submit(self._decode_block, block, decompressed_size))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _read_record_blocks_v3(self):
+        """
+        yield (compressed record block, decompressed size)
+        """
         # record index has redudant information about block compressed/decompresed size
         record_index = self._read_record_index()
 
         f = open(self._fname, 'rb')
         f.seek(self._record_block_offset)
 
-        offset = 0
-        i = 0
-        size_counter = 0
-
         num_record_blocks = self._read_int32(f)
         num_bytes = self._read_number(f)
         for j in range(num_record_blocks):
@@ -541,26 +1118,14 @@ class MDict(object):
                 f.read(compressed_size)
                 continue
 
-            record_block = self._decode_block(f.read(compressed_size), decompressed_size)
+            yield f.read(compressed_size), decompressed_size
 
-            # split record block according to the offset info from key block
-            while i < len(self._key_list):
-                record_start, key_text = self._key_list[i]
-                # reach the end of current record block
-                if record_start - offset >= len(record_block):
-                    break
-                # record end index
-                if i < len(self._key_list)-1:
-                    record_end = self._key_list[i+1][0]
-                else:
-                    record_end = len(record_block) + offset
-                i += 1
-                data = record_block[record_start-offset:record_end-offset]
-                yield key_text, self._treat_record_data(data)
-            offset += len(record_block)
-            size_counter += compressed_size
+        f.close()
 
-    def _read_records_v1v2(self):
+    def _read_record_blocks_v1v2(self):
+        """
+        yield (compressed record block, decompressed size)
+        """
         f = open(self._fname, 'rb')
         f.seek(self._record_block_offset)
 
@@ -581,27 +1146,9 @@ class MDict(object):
         assert(size_counter == record_block_info_size)
 
         # actual record block
-        offset = 0
-        i = 0
         size_counter = 0
         for compressed_size, decompressed_size in record_block_info_list:
-            record_block = self._decode_block(f.read(compressed_size), decompressed_size)
-
-            # split record block according to the offset info from key block
-            while i < len(self._key_list):
-                record_start, key_text = self._key_list[i]
-                # reach the end of current record block
-                if record_start - offset >= len(record_block):
-                    break
-                # record end index
-                if i < len(self._key_list)-1:
-                    record_end = self._key_list[i+1][0]
-                else:
-                    record_end = len(record_block) + offset
-                i += 1
-                data = record_block[record_start-offset:record_end-offset]
-                yield key_text, self._treat_record_data(data)
-            offset += len(record_block)
+            yield f.read(compressed_size), decompressed_size
             size_counter += compressed_size
         assert(size_counter == record_block_size)
 
@@ -630,6 +1177,77 @@ class MDict(object):
         f.close()
         return record_index
 
+    def _read_record_block_index(self):
+        """
+        Return arrays of file offset, compressed size and decompressed offset of record blocks.
+        Decompressed offset has one more item for the end of the last block.
+        """
+        block_offsets = array('Q')
+        compressed_sizes = array('Q')
+        decompressed_offsets = array('Q', [0])
+
+        f = open(self._fname, 'rb')
+        f.seek(self._record_block_offset)
+        if self._version >= 3:
+            num_record_blocks = self._read_int32(f)
+            self._read_number(f)
+            decompressed_offset = 0
+            for i in range(num_record_blocks):
+                decompressed_size, compressed_size = unpack('>II', f.read(8))
+                block_offsets.append(f.tell())
+                compressed_sizes.append(compressed_size)
+                decompressed_offset += decompressed_size
+                decompressed_offsets.append(decompressed_offset)
+                f.seek(compressed_size, 1)
+        else:
+            num_record_blocks = self._read_number(f)
+            self._read_number(f)
+            record_block_info_size = self._read_number(f)
+            self._read_number(f)
+            record_block_info = unpack(
+                '>%d%s' % (num_record_blocks * 2, self._number_format[1:]),
+                f.read(record_block_info_size))
+            block_offset = f.tell()
+            decompressed_offset = 0
+            for i in range(0, len(record_block_info), 2):
+                compressed_size, decompressed_size = record_block_info[i:i+2]
+                block_offsets.append(block_offset)
+                compressed_sizes.append(compressed_size)
+                block_offset += compressed_size
+                decompressed_offset += decompressed_size
+                decompressed_offsets.append(decompressed_offset)
+        f.close()
+        return block_offsets, compressed_sizes, decompressed_offsets
+
+    def _locate_record_blocks(self, offsets):
+        """
+        Return list of (index, decompressed offset) of record blocks which contain record offsets.
+        """
+        if self._record_block_index is None:
+            self._record_block_index = self._read_record_block_index()
+        decompressed_offsets = self._record_block_index[2]
+        result = []
+        for i, offset in zip(_searchsorted(decompressed_offsets, offsets, 'right'), offsets):
+            i -= 1
+            if i < 0 or i >= len(decompressed_offsets) - 1:
+                raise IndexError('record offset %d out of range' % offset)
+            result.append((i, decompressed_offsets[i]))
+        return result
+
+    def _locate_record_block(self, offset):
+        """
+        Return (index, file offset, compressed size, decompressed offset, decompressed size)
+        of record block which contains record offset.
+        """
+        if self._record_block_index is None:
+            self._record_block_index = self._read_record_block_index()
+        block_offsets, compressed_sizes, decompressed_offsets = self._record_block_index
+        i = bisect_right(decompressed_offsets, offset) - 1
+        if i < 0 or i >= len(block_offsets):
+            raise IndexError('record offset %d out of range' % offset)
+        return (i, block_offsets[i], compressed_sizes[i], decompressed_offsets[i],
+                decompressed_offsets[i + 1] - decompressed_offsets[i])
+
     def _treat_record_data(self, data):
         return data
 
@@ -643,8 +1261,9 @@ class MDD(MDict):
     >>> for filename,content in mdd.items():
     ... print filename, content[:10]
     """
-    def __init__(self, fname, passcode=None):
-        MDict.__init__(self, fname, encoding='UTF-16', passcode=passcode)
+    def __init__(self, fname, passcode=None, index=False, lazy=False, workers=None):
+        MDict.__init__(self, fname, encoding='UTF-16', passcode=passcode, index=index, lazy=lazy,
+                       workers=workers)
 
 
 class MDX(MDict):
@@ -656,8 +1275,9 @@ class MDX(MDict):
     >>> for key,value in mdx.items():
     ... print key, value[:10]
     """
-    def __init__(self, fname, encoding='', substyle=False, passcode=None):
-        MDict.__init__(self, fname, encoding, passcode)
+    def __init__(self, fname, encoding='', substyle=False, passcode=None, index=False, lazy=False,
+                 workers=None):
+        MDict.__init__(self, fname, encoding, passcode, index, lazy, workers)
         self._substyle = substyle
 
     def _substitute_stylesheet(self, txt):
@@ -0,0 +1,90 @@
+import os
+import sys
+import mmap
+from array import array
+from struct import Struct
+
+
+# sidecar file of MDX/MDD, such as "<mdx>.idx" and "<mdx>.fuzzy"
+#   header
+#     magic of format                   (8 bytes)
+#     size and mtime of source file     (uint64, int64, mtime in nanoseconds)
+#     header checksum of source file    (uint32, adler32 in MDX/MDD file)
+#     number count                      (uint32)
+#   numbers of format                   (number count * uint64, such as size of parts)
+#   parts of format                     (every part is padded to 8 bytes)
+# numbers are stored in native byte order, only little endian host is supported
+SIDECAR_HEADER = Struct('<8sQqII')
+
+
+def source_stat(fname, checksum):
+    """Return (size, mtime, header checksum) of source file, sidecar file is checked against it"""
+    st = os.stat(fname)
+    return st.st_size, st.st_mtime_ns, checksum
+
+
+def save(fname, magic, stat, numbers, parts):
+    """write sidecar file
+
+    stat: source_stat() of source file
+    numbers: list of uint64 which load() passes to layout
+    parts: list of bytes like objects, such as array
+
+    It is written to temporary file first, other process may be reading it.
+    The temporary file is removed if writing fails.
+    """
+    size, mtime, checksum = stat
+    tmp_fname = '%s.%d.tmp' % (fname, os.getpid())
+    try:
+        with open(tmp_fname, 'wb') as f:
+            f.write(SIDECAR_HEADER.pack(magic, size, mtime, checksum, len(numbers)))
+            f.write(array('Q', numbers).tobytes())
+            for part in parts:
+                f.write(part)
+                f.write(b'\0' * (-memoryview(part).nbytes % 8))
+        os.replace(tmp_fname, fname)
+    except BaseException:
+        if os.path.exists(tmp_fname):
+            os.remove(tmp_fname)
+        raise
+
+
+def load(fname, magic, stat, layout):
+    """map sidecar file, return (numbers, parts), None if it is missing, out of date or broken
+
+    stat: source_stat() of source file
+    layout: function of numbers, return list of (size in bytes, typecode) of every part.
+        part is cast to typecode, such as 'Q', it is left as bytes if typecode is None
+    """
+    if sys.byteorder != 'little':
+        return None
+    try:
+        with open(fname, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mm) < SIDECAR_HEADER.size:
+        return None
+    file_magic, size, mtime, checksum, count = SIDECAR_HEADER.unpack_from(mm)
+    if file_magic != magic or (size, mtime, checksum) != tuple(stat):
+        return None
+    pos = SIDECAR_HEADER.size + count * 8
+    if len(mm) < pos:
+        return None
+    buf = memoryview(mm)
+    numbers = buf[SIDECAR_HEADER.size:pos].cast('Q').tolist()
+    try:
+        sizes = layout(numbers)
+    except (ArithmeticError, LookupError, ValueError):
+        # numbers of other version or broken file
+        return None
+    parts = []
+    for size, typecode in sizes:
+        if pos + size > len(mm):
+            return None
+        part = buf[pos:pos + size]
+        parts.append(part.cast(typecode) if typecode else part)
+        pos += size + (-size % 8)
+    if pos != len(mm):
+        return None
+    return numbers, parts
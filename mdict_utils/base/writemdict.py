@@ -2,7 +2,7 @@
 writemdict.py - a library for creating dictionary files in the MDict file format.
 
 Optional dependencies:
-  python-lzo: Required to write dictionaries using LZO compression. (Other compression schemes are available.)
+  python-lzo: Faster LZO compression. Pure python LZO1X-1 compressor in lzo.py is used without it.
 
 Simple usage example: 
 
@@ -28,17 +28,14 @@ Simple usage example:
 from __future__ import unicode_literals
 
 import struct, zlib, operator, sys, datetime
+from array import array
 
 from .ripemd128 import ripemd128
 # from cgi import escape
 from html import escape
 from .pureSalsa20 import Salsa20
 
-try:
-	from . import lzo
-	HAVE_LZO = True
-except ImportError:
-	HAVE_LZO = False
+from . import lzo
 
 class ParameterError(Exception):
 	### Raised when some parameter to MdxWriter is invalid or uninterpretable.
@@ -52,10 +49,7 @@ def _mdx_compress(data, compression_type=2):
 	elif compression_type == 2:
 		return header + zlib.compress(data)
 	elif compression_type == 1:
-		if HAVE_LZO:
-			return header + lzo.compress(data)[5:] #python-lzo adds a 5-byte header.
-		else:
-			raise NotImplementedError()
+		return header + lzo.compress(data)
 	else:
 		raise ParameterError("Unknown compression type")
 		
@@ -131,17 +125,55 @@ def encrypt_key(dict_key, **kwargs):
 	return _hexdump(output_key)
 	
 
-class _OffsetTableEntry(object):
-	# Each OffsetTableEntry represents one key/record pair of the dictionary.
-	# In addition to the values themselves, it contains information about
-	# the offset at which this entry will be placed (i.e. the total length
-	# of records before it) which is required by the MDX format.
-	def __init__(self, key, key_null, key_len, offset, record_null):
-		self.key = key
-		self.key_null = key_null
-		self.key_len = key_len
-		self.offset = offset
-		self.record_null = record_null
+class _OffsetTable(object):
+	# The key/record pairs of the dictionary, in key order. Entries are stored
+	# in columns, entry i is:
+	#  key_null(i): encoded version of the key, null-terminated
+	#  key(i): encoded version of the key, not null-terminated
+	#  key_len[i]: the length of the key, in either bytes or 2-byte units, not counting the null character
+	#  offset[i]: the offset at which this entry will be placed (i.e. the total length
+	#        of records before it) which is required by the MDX format
+	#  record_size[i]: the length of record_null(i)
+	#  record_null(i): encoded version of the record, null-terminated
+	#
+	# null_length is the length of the encoded null character.
+	# offset is the offset of the first entry, end_offset is the offset after the last entry.
+	def __init__(self, null_length, offset=0):
+		self._null_length = null_length
+		self._key_data = bytearray()
+		self._key_starts = array("Q", [0])
+		self.key_len = array("L")
+		self.offset = array("Q")
+		self.record_size = array("Q")
+		self.end_offset = offset
+		self._records = []
+	
+	def __len__(self):
+		return len(self.offset)
+	
+	def append(self, key_null, key_len, record_null):
+		self._append_key(key_null, key_len, len(record_null))
+		self._records.append(record_null)
+	
+	def _append_key(self, key_null, key_len, record_size):
+		self._key_data += key_null
+		self._key_starts.append(len(self._key_data))
+		self.key_len.append(key_len)
+		self.offset.append(self.end_offset)
+		self.record_size.append(record_size)
+		self.end_offset += record_size
+	
+	def key_null(self, i):
+		return bytes(self._key_data[self._key_starts[i]:self._key_starts[i+1]])
+	
+	def key(self, i):
+		return bytes(self._key_data[self._key_starts[i]:self._key_starts[i+1]-self._null_length])
+	
+	def key_null_size(self, i):
+		return self._key_starts[i+1] - self._key_starts[i]
+	
+	def record_null(self, i):
+		return self._records[i]
 
 class MDictWriter(object):
 	
@@ -268,26 +300,16 @@ class MDictWriter(object):
 		self._build_recordb_index()
 		
 	def _build_offset_table(self,d):
-		# Sets self._offset_table to a table of entries _OffsetTableEntry objects e.
-		#
-		# where:
-		#  e.key: encoded version of the key, not null-terminated
-		#  e.key_null: encoded version of the key, null-terminated
-		#  e.key_len: the length of the key, in either bytes or 2-byte units, not counting the null character
-		#        (as required by the MDX format in the keyword index)
-		#  e.offset: the cumulative sum of len(record_null) for preceding records
-		#  e.record_null: encoded version of the record, null-terminated
+		# Sets self._offset_table to an _OffsetTable of the entries, sorted by key.
 		#
 		# Also sets self._total_record_len to the total length of all record fields.
 		items = list(d.items())
 		items.sort(key=operator.itemgetter(0))
 		
-		self._offset_table = []
-		offset = 0
+		self._offset_table = _OffsetTable(self._encoding_length)
 		for key, record in items:
-			key_enc = key.encode(self._python_encoding)
 			key_null = (key+"\0").encode(self._python_encoding)
-			key_len = len(key_enc) // self._encoding_length
+			key_len = len(key_null) // self._encoding_length - 1
 			
 			# set record_null to a the the value of the record. If it's
 			# an MDX file, append an extra null character.
@@ -295,14 +317,8 @@ class MDictWriter(object):
 				record_null = record
 			else:
 				record_null = (record+"\0").encode(self._python_encoding) 
-			self._offset_table.append(_OffsetTableEntry(
-			    key=key_enc,
-			    key_null=key_null,
-			    key_len=key_len,
-			    record_null=record_null,
-			    offset=offset))
-			offset += len(record_null)
-		self._total_record_len = offset
+			self._offset_table.append(key_null, key_len, record_null)
+		self._total_record_len = self._offset_table.end_offset
 	
 	def _split_blocks(self, block_type):
 		# Split either the records or the keys into blocks for compression.
@@ -316,31 +332,27 @@ class MDictWriter(object):
 		this_block_start = 0
 		cur_size = 0
 		blocks = []
-		for ind in range(len(self._offset_table)+1):
-			if ind != len(self._offset_table):
-				t = self._offset_table[ind]
-			else:
-				t = None
-			
+		t = self._offset_table
+		for ind in range(len(t)+1):
 			if ind == 0:
 				flush = False 
 				# nothing to flush yet
 				# this part is needed in case the first entry is longer than
 				# self._block_size.
-			elif ind == len(self._offset_table):
+			elif ind == len(t):
 				flush = True #always flush the last block
-			elif cur_size + block_type._len_block_entry(t) > self._block_size:
+			elif cur_size + block_type._len_block_entry(t, ind) > self._block_size:
 				flush = True #Adding this entry to make us larger than
 				             #self._block_size, so flush now.
 			else:
 				flush = False
 			if flush:
 				blocks.append(block_type(
-				    self._offset_table[this_block_start:ind], self._compression_type, self._version))
+				    t, this_block_start, ind, self._compression_type, self._version))
 				cur_size = 0
 				this_block_start = ind
-			if t is not None: #mentally add this entry to list of things 
-				cur_size += block_type._len_block_entry(t)
+			if ind != len(t): #mentally add this entry to list of things 
+				cur_size += block_type._len_block_entry(t, ind)
 		return blocks
 		
 	def _build_key_blocks(self):
@@ -359,7 +371,8 @@ class MDictWriter(object):
 		decomp_data = b"".join(b.get_index_entry() for b in self._key_blocks)
 		self._keyb_index_decomp_size = len(decomp_data)
 		if self._version == "2.0":
-			self._keyb_index = _mdx_compress(decomp_data, self._compression_type)
+			# key block index is always zlib compressed in version 2.0
+			self._keyb_index = _mdx_compress(decomp_data, 2)
 			if self._encrypt_index:
 				self._keyb_index = _mdx_encrypt(self._keyb_index)
 			self._keyb_index_comp_size = len(self._keyb_index)
@@ -542,14 +555,14 @@ class _MdxBlock(object):
 	# be built in a uniform manner.
 	#
 	
-	def __init__(self, offset_table, compression_type, version):
-		# Builds the data from offset_table.
+	def __init__(self, offset_table, start, end, compression_type, version):
+		# Builds the data from entries start to end of offset_table.
 		#
-		# offset_table is a iterable containing _OffsetTableEntry objects.
+		# offset_table is an _OffsetTable.
 		
 		decomp_data = b"".join(
-		    type(self)._block_entry(t, version)
-		    for t in offset_table)
+		    type(self)._block_entry(offset_table, i, version)
+		    for i in range(start, end))
 		self._decomp_size = len(decomp_data)
 		self._comp_data = _mdx_compress(decomp_data, compression_type)
 		self._comp_size = len(self._comp_data)
@@ -566,16 +579,16 @@ class _MdxBlock(object):
 		raise NotImplementedError()
 		
 	@staticmethod
-	def _block_entry(t, version):
-		# Returns the data corresponding to a single entry in offset.
+	def _block_entry(t, i, version):
+		# Returns the data corresponding to entry i in offset table.
 		#
-		# t is an _OffsetTableEntry object
+		# t is an _OffsetTable object
 		
 		raise NotImplementedError()
 	
 	@staticmethod
-	def _len_block_entry(t):
-		# Should be approximately equal to len(_block_entry(t)).
+	def _len_block_entry(t, i):
+		# Should be approximately equal to len(_block_entry(t, i)).
 		#
 		# Used by MdxWriter._split_blocks() to determine where to split into blocks."""
 		raise NotImplementedError()
@@ -587,14 +600,14 @@ class _MdxRecordBlock(_MdxBlock):
 	# both the block itself, as well as the entry in the record block index for that
 	# block.
 
-	def __init__(self, offset_table, compression_type, version):
-		# Builds the data for offset_table.
+	def __init__(self, offset_table, start, end, compression_type, version):
+		# Builds the data for entries start to end of offset_table.
 		#
-		# offset_table is a iterable containing _OffsetTableEntry objects.
+		# offset_table is an _OffsetTable.
 		#
 		# Actually only uses the record parts.
 		
-		_MdxBlock.__init__(self, offset_table, compression_type, version)
+		_MdxBlock.__init__(self, offset_table, start, end, compression_type, version)
 		
 	def get_index_entry(self):
 		# Returns a bytes object, containing the entry for this block in the record
@@ -607,12 +620,12 @@ class _MdxRecordBlock(_MdxBlock):
 		return struct.pack(format, self._comp_size, self._decomp_size)
 	
 	@staticmethod
-	def _block_entry(t, version):
-		return t.record_null
+	def _block_entry(t, i, version):
+		return t.record_null(i)
 	
 	@staticmethod
-	def _len_block_entry(t):
-		return len(t.record_null)
+	def _len_block_entry(t, i):
+		return t.record_size[i]
 	
 class _MdxKeyBlock(_MdxBlock):
 	# A class representing a key block.
@@ -620,35 +633,35 @@ class _MdxKeyBlock(_MdxBlock):
 	# Has the ability to return (in the format suitable for insertion in an mdx file) 
 	# both the block itself, as well as the entry in the record block index for that
 	# block.
-	def __init__(self, offset_table, compression_type, version):
-		# Builds the data for offset_table.
+	def __init__(self, offset_table, start, end, compression_type, version):
+		# Builds the data for entries start to end of offset_table.
 		#
-		# offset_table is a iterable containing _OffsetTableEntry objects.
+		# offset_table is an _OffsetTable.
 		#
 		# Only uses the key, key_len, key_null and offset fields, and effectively ignores record_null.
 
-		_MdxBlock.__init__(self, offset_table, compression_type, version)
-		self._num_entries = len(offset_table)
+		_MdxBlock.__init__(self, offset_table, start, end, compression_type, version)
+		self._num_entries = end - start
 		if version=="2.0":
-			self._first_key = offset_table[0].key_null
-			self._last_key = offset_table[len(offset_table)-1].key_null
+			self._first_key = offset_table.key_null(start)
+			self._last_key = offset_table.key_null(end-1)
 		else:
-			self._first_key = offset_table[0].key
-			self._last_key = offset_table[len(offset_table)-1].key
-		self._first_key_len = offset_table[0].key_len
-		self._last_key_len = offset_table[len(offset_table)-1].key_len
+			self._first_key = offset_table.key(start)
+			self._last_key = offset_table.key(end-1)
+		self._first_key_len = offset_table.key_len[start]
+		self._last_key_len = offset_table.key_len[end-1]
 	
 	@staticmethod
-	def _block_entry(t, version):
+	def _block_entry(t, i, version):
 		if version == "2.0":
 			format = b">Q"
 		else:
 			format = b">L"
-		return struct.pack(format, t.offset)+t.key_null
+		return struct.pack(format, t.offset[i])+t.key_null(i)
 	
 	@staticmethod
-	def _len_block_entry(t):
-		return 8 + len(t.key_null) #This is only accurate for version 2.0, but we only need approximate size anyway
+	def _len_block_entry(t, i):
+		return 8 + t.key_null_size(i) #This is only accurate for version 2.0, but we only need approximate size anyway
 	
 	def get_index_entry(self):
 		# Returns a bytes object, containing the header data for this block
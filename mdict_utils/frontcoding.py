@@ -0,0 +1,244 @@
+from array import array
+from bisect import bisect_left
+
+from .base import sidecar
+
+
+# front coded key list file, see sidecar module for header
+#   numbers: key count, bucket size, bucket data size, key order
+#   start of every bucket in bucket data    ((bucket count + 1) * uint64)
+#   record offset of first key of bucket    (bucket count * uint64)
+#   bucket data
+# bucket has bucket size keys, every key is
+#   varint of record offset delta, varint of common prefix size with previous key,
+#   varint of suffix size, suffix
+# first key of bucket is stored in full, record offset delta is 0
+# key order: 0 not checked, 1 keys follow sort_key order, 2 they do not
+FRONT_CODING_MAGIC = b'MDXFCK02'
+BUCKET_SIZE = 16
+
+
+def encode_varint(data, value):
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def decode_varint(data, pos):
+    """Return (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return value, pos
+        shift += 7
+
+
+def common_prefix_size(a, b):
+    size = min(len(a), len(b))
+    for i in range(size):
+        if a[i] != b[i]:
+            return i
+    return size
+
+
+class FrontCodedKeyList(object):
+    """Front coded sequence of (record offset, key text) in key order, such as MDict._key_list.
+
+    Keys are grouped in buckets of BUCKET_SIZE, only the first key of bucket is
+    stored in full, others store the suffix after common prefix with previous key.
+    A key is found by binary search over the first keys of buckets, so keys must
+    follow sort_key order, which is MDict._sort_key.
+
+    It can replace both MDict._key_list and MDict._key_index.
+    """
+    def __init__(self, bucket_starts, bucket_offsets, data, count, bucket_size=BUCKET_SIZE, sort_key=None):
+        self._bucket_starts = bucket_starts
+        self._bucket_offsets = bucket_offsets
+        self._data = data
+        self._count = count
+        self._bucket_size = bucket_size
+        self._sort_key = sort_key or bytes
+        # the last decoded bucket, (bucket number, [(record offset, key text)])
+        self._bucket = (-1, [])
+        # keys follow sort_key order, None if it is not checked. it is saved in file
+        self.key_order = None
+
+    def __len__(self):
+        return self._count
+
+    @classmethod
+    def build(cls, key_list, bucket_size=BUCKET_SIZE, sort_key=None):
+        """key_list: iterable of (record offset, key text)"""
+        bucket_starts = array('Q', [0])
+        bucket_offsets = array('Q')
+        data = bytearray()
+        count = 0
+        last_key = b''
+        for offset, key in key_list:
+            if count % bucket_size == 0:
+                if count:
+                    bucket_starts.append(len(data))
+                bucket_offsets.append(offset)
+                prefix_size = 0
+            else:
+                prefix_size = common_prefix_size(last_key, key)
+            encode_varint(data, offset - bucket_offsets[-1])
+            encode_varint(data, prefix_size)
+            encode_varint(data, len(key) - prefix_size)
+            data += key[prefix_size:]
+            last_key = key
+            count += 1
+        if count:
+            bucket_starts.append(len(data))
+        return cls(bucket_starts, bucket_offsets, bytes(data), count, bucket_size, sort_key)
+
+    def save(self, fname, stat):
+        """stat: source_stat() of dictionary file"""
+        key_order = {None: 0, True: 1, False: 2}[self.key_order]
+        sidecar.save(fname, FRONT_CODING_MAGIC, stat, [
+            self._count, self._bucket_size, len(self._data), key_order,
+        ], [
+            self._bucket_starts, self._bucket_offsets, self._data,
+        ])
+
+    @classmethod
+    def load(cls, fname, stat, sort_key=None):
+        """map key list file, return None if it is missing or out of date"""
+        def layout(numbers):
+            count, bucket_size, data_size, key_order = numbers
+            bucket_count = (count + bucket_size - 1) // bucket_size
+            return [
+                ((bucket_count + 1) * 8, 'Q'),
+                (bucket_count * 8, 'Q'),
+                (data_size, None),
+            ]
+
+        result = sidecar.load(fname, FRONT_CODING_MAGIC, stat, layout)
+        if result is None:
+            return None
+        (count, bucket_size, data_size, key_order), parts = result
+        key_list = cls(*parts, count=count, bucket_size=bucket_size, sort_key=sort_key)
+        key_list.key_order = {1: True, 2: False}.get(key_order)
+        return key_list
+
+    def _decode_bucket(self, b):
+        """Return [(record offset, key text)] of bucket b"""
+        bucket = self._bucket
+        if bucket[0] == b:
+            return bucket[1]
+        data = self._data
+        pos = self._bucket_starts[b]
+        end = self._bucket_starts[b + 1]
+        bucket_offset = self._bucket_offsets[b]
+        key = b''
+        key_list = []
+        while pos < end:
+            offset, pos = decode_varint(data, pos)
+            prefix_size, pos = decode_varint(data, pos)
+            suffix_size, pos = decode_varint(data, pos)
+            key = key[:prefix_size] + bytes(data[pos:pos + suffix_size])
+            pos += suffix_size
+            key_list.append((bucket_offset + offset, key))
+        self._bucket = (b, key_list)
+        return key_list
+
+    def _head(self, b):
+        """first key of bucket b"""
+        data = self._data
+        _, pos = decode_varint(data, self._bucket_starts[b])
+        _, pos = decode_varint(data, pos)
+        size, pos = decode_varint(data, pos)
+        return bytes(data[pos:pos + size])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('key index out of range')
+        b, i = divmod(index, self._bucket_size)
+        return self._decode_bucket(b)[i]
+
+    def __iter__(self):
+        for b in range(len(self._bucket_offsets)):
+            yield from self._decode_bucket(b)
+
+    def select(self, index):
+        """key text at index"""
+        return self[index][1]
+
+    def rank(self, key):
+        """index of the first key equal to key, None if it is not found"""
+        x = self.get(key)
+        if x is None:
+            return None
+        return x if isinstance(x, int) else x[0]
+
+    def _first_bucket(self, sort_key):
+        """the bucket which may contain the first key not less than sort_key"""
+        lo, hi = 0, len(self._bucket_offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._sort_key(self._head(mid)) < sort_key:
+                lo = mid + 1
+            else:
+                hi = mid
+        # keys before the first key of bucket lo are in the previous bucket
+        return max(lo - 1, 0)
+
+    def _scan(self, sort_key):
+        """Yield (index, key text) from the first key not less than sort_key"""
+        b = self._first_bucket(sort_key)
+        index = b * self._bucket_size
+        for b in range(b, len(self._bucket_offsets)):
+            for offset, key in self._decode_bucket(b):
+                if self._sort_key(key) >= sort_key:
+                    yield index, key
+                index += 1
+
+    def get(self, key, default=None):
+        """index of key, list of indexes for duplicate key. like dict of MDict._key_index"""
+        sort_key = self._sort_key(key)
+        result = []
+        for index, key_text in self._scan(sort_key):
+            if self._sort_key(key_text) != sort_key:
+                break
+            if key_text == key:
+                result.append(index)
+        if not result:
+            return default
+        return result[0] if len(result) == 1 else result
+
+    def prefix(self, prefix):
+        """Yield (index, key text) of keys whose sort key starts with the sort key of prefix"""
+        sort_key = self._sort_key(prefix)
+        for index, key in self._scan(sort_key):
+            if not self._sort_key(key).startswith(sort_key):
+                break
+            yield index, key
+
+    def searchsorted(self, offsets):
+        """
+        Return the position of the first key whose record offset is not less than offset,
+        for every offset. like MDict._key_list.searchsorted
+        """
+        result = []
+        for offset in offsets:
+            b = bisect_left(self._bucket_offsets, offset)
+            if b == 0:
+                result.append(0)
+                continue
+            # keys of bucket b - 1 may be less than offset
+            index = (b - 1) * self._bucket_size
+            for record_offset, key in self._decode_bucket(b - 1):
+                if record_offset >= offset:
+                    break
+                index += 1
+            result.append(index)
+        return result
@@ -0,0 +1,154 @@
+import re
+from array import array
+from html import unescape
+
+from .base import sidecar
+
+
+# full text index file, see sidecar module for header
+#   numbers: term count, term data size, posting data size
+#   start of every term in term data            ((term count + 1) * uint64)
+#   term data                                   (UTF-8, sorted, concatenated)
+#   start of every posting list                 ((term count + 1) * uint64)
+#   posting list, key number in key order       (varint of delta)
+FTS_INDEX_MAGIC = b'MDXFTS02'
+
+regex_tag = re.compile(r'<[^>]*>')
+# CJK character is one term
+CJK = '぀-ヿ㐀-䶿一-鿿豈-﫿가-힯'
+regex_term = re.compile(r'[%s]|[^\W_%s]+' % (CJK, CJK))
+
+
+def strip_html(text):
+    """plain text of HTML"""
+    return unescape(regex_tag.sub(' ', text))
+
+
+def tokenize(text):
+    """terms of HTML text, in lower case"""
+    return regex_term.findall(strip_html(text).casefold())
+
+
+def encode_postings(postings):
+    data = bytearray()
+    last = 0
+    for x in postings:
+        delta = x - last
+        last = x
+        while delta >= 0x80:
+            data.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return data
+
+
+def decode_postings(data):
+    postings = []
+    last = 0
+    delta = 0
+    shift = 0
+    for b in data:
+        delta |= (b & 0x7f) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        last += delta
+        postings.append(last)
+        delta = 0
+        shift = 0
+    return postings
+
+
+class FullTextIndex(object):
+    """Inverted index of MDX records, term to key numbers which is position in key list."""
+    def __init__(self, term_starts, term_data, posting_starts, posting_data):
+        self._term_starts = term_starts
+        self._term_data = term_data
+        self._posting_starts = posting_starts
+        self._posting_data = posting_data
+
+    def __len__(self):
+        return len(self._term_starts) - 1
+
+    @classmethod
+    def build(cls, records, callback=None):
+        """records: iterator of record text in key order"""
+        term_postings = {}
+        for x, record in enumerate(records):
+            for term in set(tokenize(record)):
+                postings = term_postings.get(term)
+                if postings is None:
+                    postings = term_postings[term] = array('I')
+                postings.append(x)
+            callback and callback(1)
+
+        term_starts = array('Q', [0])
+        term_data = []
+        posting_starts = array('Q', [0])
+        posting_data = bytearray()
+        pos = 0
+        for data, term in sorted((term.encode('UTF-8'), term) for term in term_postings):
+            term_data.append(data)
+            pos += len(data)
+            term_starts.append(pos)
+            posting_data += encode_postings(term_postings.pop(term))
+            posting_starts.append(len(posting_data))
+        return cls(term_starts, b''.join(term_data), posting_starts, bytes(posting_data))
+
+    def save(self, fname, stat):
+        """stat: source_stat() of dictionary file"""
+        sidecar.save(fname, FTS_INDEX_MAGIC, stat, [
+            len(self), len(self._term_data), len(self._posting_data),
+        ], [
+            self._term_starts, self._term_data, self._posting_starts, self._posting_data,
+        ])
+
+    @classmethod
+    def load(cls, fname, stat):
+        """map index file, return None if it is missing or out of date"""
+        def layout(numbers):
+            term_count, term_data_size, posting_data_size = numbers
+            return [
+                ((term_count + 1) * 8, 'Q'),
+                (term_data_size, None),
+                ((term_count + 1) * 8, 'Q'),
+                (posting_data_size, None),
+            ]
+
+        result = sidecar.load(fname, FTS_INDEX_MAGIC, stat, layout)
+        if result is None:
+            return None
+        return cls(*result[1])
+
+    def _term(self, x):
+        return bytes(self._term_data[self._term_starts[x]:self._term_starts[x + 1]])
+
+    def postings(self, term):
+        """key numbers of records which contain term"""
+        term = term.encode('UTF-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._term(lo) == term:
+            return decode_postings(self._posting_data[self._posting_starts[lo]:self._posting_starts[lo + 1]])
+        return []
+
+    def search(self, text):
+        """key numbers of records which contain all terms of text, in key order"""
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+        result = None
+        # intersect from the shortest posting list
+        for postings in sorted((self.postings(term) for term in terms), key=len):
+            if result is None:
+                result = set(postings)
+            else:
+                result.intersection_update(postings)
+            if not result:
+                break
+        return sorted(result)
@@ -0,0 +1,185 @@
+from array import array
+from bisect import bisect_left
+
+from .base import sidecar
+
+
+# fuzzy index file, see sidecar module for header
+#   numbers: key count, key data size, gram count, gram data size, posting count, max key length
+#   first key number of every key length    ((max key length + 2) * uint64)
+#   start of every key in key data          ((key count + 1) * uint64)
+#   key data                                (UTF-8, concatenated)
+#   start of every gram in gram data        ((gram count + 1) * uint64)
+#   gram data                               (UTF-8, sorted, concatenated)
+#   start of every posting list             ((gram count + 1) * uint64)
+#   posting list, key number of every gram  (uint32)
+# keys are numbered in the order of normalized key length, so are posting lists
+FUZZY_INDEX_MAGIC = b'MDXFZY03'
+GRAM_SIZE = 3
+
+
+def normalize(word):
+    return word.casefold()
+
+
+def grams(word):
+    """set of trigrams of word, padded at both ends"""
+    word = '\0' * (GRAM_SIZE - 1) + normalize(word) + '\0' * (GRAM_SIZE - 1)
+    return set(word[i:i + GRAM_SIZE] for i in range(len(word) - GRAM_SIZE + 1))
+
+
+def levenshtein(s, t, max_distance=None):
+    """edit distance of s and t, return max_distance + 1 once it is exceeded"""
+    if len(s) < len(t):
+        s, t = t, s
+    if max_distance is None:
+        max_distance = len(s)
+    if len(s) - len(t) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(t) + 1))
+    for i, c in enumerate(s, 1):
+        current = [i]
+        for j, d in enumerate(t, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (c != d)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyIndex(object):
+    """Trigram index of dictionary keys for edit distance search.
+
+    A key within max_distance edits of the word shares at least
+    len(grams(word)) - max_distance * 3 trigrams with it, so only such keys
+    are verified with levenshtein(). Its length differs from the word by
+    max_distance at most, such keys are a range of key numbers.
+    """
+    def __init__(self, length_starts, key_starts, key_data, gram_starts, gram_data, posting_starts,
+                 postings):
+        self._length_starts = length_starts
+        self._key_starts = key_starts
+        self._key_data = key_data
+        self._gram_starts = gram_starts
+        self._gram_data = gram_data
+        self._posting_starts = posting_starts
+        self._postings = postings
+
+    def __len__(self):
+        return len(self._key_starts) - 1
+
+    @classmethod
+    def build(cls, keys):
+        # duplicate keys are dropped, key numbers follow normalized key length
+        keys = sorted(set(keys), key=lambda key: len(normalize(key)))
+        length_starts = array('Q', [0])
+        key_starts = array('Q', [0])
+        key_data = []
+        gram_postings = {}
+        pos = 0
+        count = 0
+        for key in keys:
+            while len(length_starts) <= len(normalize(key)):
+                length_starts.append(count)
+            data = key.encode('UTF-8')
+            key_data.append(data)
+            pos += len(data)
+            key_starts.append(pos)
+            for gram in grams(key):
+                posting = gram_postings.get(gram)
+                if posting is None:
+                    posting = gram_postings[gram] = array('I')
+                posting.append(count)
+            count += 1
+        length_starts.append(count)
+
+        gram_starts = array('Q', [0])
+        gram_data = []
+        posting_starts = array('Q', [0])
+        postings = array('I')
+        pos = 0
+        for data, gram in sorted((gram.encode('UTF-8'), gram) for gram in gram_postings):
+            gram_data.append(data)
+            pos += len(data)
+            gram_starts.append(pos)
+            postings.extend(gram_postings[gram])
+            posting_starts.append(len(postings))
+        return cls(length_starts, key_starts, b''.join(key_data), gram_starts, b''.join(gram_data),
+                   posting_starts, postings)
+
+    def save(self, fname, stat):
+        """stat: source_stat() of dictionary file"""
+        sidecar.save(fname, FUZZY_INDEX_MAGIC, stat, [
+            len(self), len(self._key_data), len(self._gram_starts) - 1, len(self._gram_data),
+            len(self._postings), len(self._length_starts) - 2,
+        ], [
+            self._length_starts, self._key_starts, self._key_data, self._gram_starts, self._gram_data,
+            self._posting_starts, self._postings,
+        ])
+
+    @classmethod
+    def load(cls, fname, stat):
+        """map index file, return None if it is missing or out of date"""
+        def layout(numbers):
+            key_count, key_data_size, gram_count, gram_data_size, posting_count, max_length = numbers
+            return [
+                ((max_length + 2) * 8, 'Q'),
+                ((key_count + 1) * 8, 'Q'),
+                (key_data_size, None),
+                ((gram_count + 1) * 8, 'Q'),
+                (gram_data_size, None),
+                ((gram_count + 1) * 8, 'Q'),
+                (posting_count * 4, 'I'),
+            ]
+
+        result = sidecar.load(fname, FUZZY_INDEX_MAGIC, stat, layout)
+        if result is None:
+            return None
+        return cls(*result[1])
+
+    def key(self, x):
+        return bytes(self._key_data[self._key_starts[x]:self._key_starts[x + 1]]).decode('UTF-8')
+
+    def _gram(self, x):
+        return bytes(self._gram_data[self._gram_starts[x]:self._gram_starts[x + 1]])
+
+    def _posting(self, gram):
+        gram = gram.encode('UTF-8')
+        lo, hi = 0, len(self._gram_starts) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._gram(mid) < gram:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._gram_starts) - 1 and self._gram(lo) == gram:
+            return self._postings[self._posting_starts[lo]:self._posting_starts[lo + 1]]
+        return []
+
+    def search(self, word, limit=10, max_distance=2):
+        """Return [(key, distance)] of nearest keys, sorted by distance"""
+        word_grams = grams(word)
+        # keys without any common trigram are never suggested
+        threshold = max(1, len(word_grams) - max_distance * GRAM_SIZE)
+        word = normalize(word)
+        # threshold is low for short word, so keys are filtered by length first.
+        # key numbers of keys whose length is within max_distance of word are first to last
+        max_length = len(self._length_starts) - 2
+        first = self._length_starts[min(max(len(word) - max_distance, 0), max_length + 1)]
+        last = self._length_starts[min(len(word) + max_distance + 1, max_length + 1)]
+        counter = {}
+        for gram in word_grams:
+            posting = self._posting(gram)
+            for x in posting[bisect_left(posting, first):bisect_left(posting, last)]:
+                counter[x] = counter.get(x, 0) + 1
+
+        result = []
+        for x, count in counter.items():
+            if count < threshold:
+                continue
+            key = self.key(x)
+            distance = levenshtein(word, normalize(key), max_distance)
+            if distance <= max_distance:
+                result.append((distance, key))
+        result.sort()
+        return [(key, distance) for distance, key in result[:limit]]
@@ -1,16 +1,304 @@
 
 import sqlite3
 import struct
+import os
 import os.path
 import zlib
+import mmap
+import re
+import threading
+import unicodedata
 
 from tqdm import tqdm
 
+from .base import lzo
 from .base.readmdict import MDX, MDD
 from .chtml import CompactHTML
+from .frontcoding import FrontCodedKeyList
+from .fuzzy import FuzzyIndex
+from .fts import FullTextIndex, strip_html
+from .utils import BlockCache
 
 
-def meta(source, substyle=False, passcode=None):
+# decompressed record blocks, key is (file name, block index)
+RECORD_BLOCK_CACHE = BlockCache()
+
+
+# punctuation and white space are removed in normalized MDX key
+regex_non_word = re.compile(r'[\W_]+')
+
+
+def normalize_key(key, is_mdd=False):
+    """Return key without case and accents. MDX key is also without punctuation,
+    MDD key uses backslash and starts with backslash.
+    """
+    key = unicodedata.normalize('NFKD', key)
+    key = ''.join(c for c in key if not unicodedata.combining(c)).casefold()
+    if is_mdd:
+        return '\\' + key.replace('/', '\\').lstrip('\\')
+    return regex_non_word.sub('', key)
+
+
+class Dictionary(object):
+    """MDX/MDD dictionary which is opened once and used for many lookups.
+
+    The file is kept mapped in memory, key index and record block index are
+    parsed at open time. workers is the number of processes to decode key blocks.
+
+    compact: keep keys front coded in memory, see FrontCodedKeyList. With index,
+    it is saved to "<mdx/mdd>.keys", and with lazy too, key blocks are not decoded.
+
+    >>> with Dictionary('dict.mdx') as d:
+    ...     d.lookup('word')
+    """
+    def __init__(self, source, substyle=False, passcode=None, index=False, lazy=False, cache=None,
+                 workers=None, compact=False):
+        self.source = source
+        self.is_mdd = source.endswith('.mdd')
+        self._index = index
+        self._fuzzy_index = None
+        self._fts_index = None
+        self._normalized_index = None
+        if self.is_mdd:
+            self._md = MDD(source, passcode, index, lazy, workers)
+        else:
+            encoding = ''
+            self._md = MDX(source, encoding, substyle, passcode, index, lazy, workers)
+        if compact:
+            # front coded key list is used as both key list and key index if keys are sorted
+            key_list = self._load_front_coded_keys()
+            if key_list.key_order is not None:
+                self._md._key_order = key_list.key_order
+            self._md._key_list = key_list
+            self._md._lazy = False
+            if self._md._keys_sorted():
+                self._md._key_index = key_list
+        self._cache = RECORD_BLOCK_CACHE if cache is None else cache
+        self._lock = threading.Lock()
+        self._file = open(source, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # key blocks of lazy mode are read from it too
+        self._md._buf = self._mmap
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._md)
+
+    def close(self):
+        if self._mmap is not None:
+            self._md._buf = None
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+    def preload(self):
+        """Build key index and record block index now instead of at first lookup"""
+        with self._lock:
+            if not self._md._lazy:
+                self._md._ensure_key_index()
+            if self._md._record_block_index is None:
+                self._md._record_block_index = self._md._read_record_block_index()
+
+    def meta(self):
+        meta = {}
+        meta['version'] = self._md._version
+        meta['record'] = len(self._md)
+        for key, value in self._md.header.items():
+            # key has been decode from UTF-16 and encode again with UTF-8
+            key = key.decode('UTF-8').lower()
+            value = value.decode('UTF-8')
+            meta[key] = value
+        return meta
+
+    def keys(self):
+        for key in self._md.keys():
+            yield key.decode('UTF-8')
+
+    def items(self, workers=None):
+        """Return (key, record), record is bytes for MDD
+
+        workers: number of threads to decode record blocks
+        """
+        for key, value in self._md.items(workers):
+            if self.is_mdd:
+                yield key.decode('UTF-8'), value
+            else:
+                yield key.decode('UTF-8'), value.strip().decode('UTF-8')
+
+    def lookup(self, word, normalize=False):
+        """Return all records of word.
+
+        normalize: if word is not found, lookup again ignoring case, accents and
+        punctuation, or slash style of MDD path. See normalize_key().
+        """
+        with self._lock:
+            locations = self._locate(word, normalize)
+        return [self.get_record(offset, length) for offset, length in locations]
+
+    def lookup_many(self, words, normalize=False):
+        """Yield (word, records) in order of words.
+
+        Records are grouped by record block, every needed block is decompressed once.
+        """
+        words = list(words)
+        with self._lock:
+            locations = [self._locate(word, normalize) for word in words]
+        # record blocks of all records are located at once
+        blocks = iter(self._md._locate_record_blocks(
+            [offset for location in locations for offset, length in location]))
+        # the number of records which are still waiting for the block
+        block_refs = {}
+        for x in range(len(locations)):
+            location = []
+            for offset, length in locations[x]:
+                index, decompressed_offset = next(blocks)
+                location.append((index, decompressed_offset, offset, length))
+                block_refs[index] = block_refs.get(index, 0) + 1
+            locations[x] = location
+        record_blocks = {}
+        for word, location in zip(words, locations):
+            records = []
+            for index, decompressed_offset, offset, length in location:
+                record_block = record_blocks.get(index)
+                if record_block is None:
+                    record_block = get_record_block(self._md, index, self._mmap, self._cache)
+                    record_blocks[index] = record_block
+                records.append(get_record_from_block(
+                    self._md, record_block, offset - decompressed_offset, length))
+                block_refs[index] -= 1
+                if block_refs[index] == 0:
+                    del record_blocks[index]
+            yield word, records
+
+    def prefix(self, word, limit=None, records=False):
+        """Yield keys starting with word in key order, (key, record) if records is True.
+
+        Keys are compared in the sort order of dictionary, such as ignoring case and punctuation.
+        If keys of dictionary are not in that order, they are yielded in file order.
+        """
+        start = self._md._sort_key(word.encode('UTF-8'))
+        count = 0
+        for key, offset, length in self._scan_keys(start, lambda sort_key: sort_key.startswith(start)):
+            if limit is not None and count >= limit:
+                break
+            count += 1
+            yield self._scan_result(key, offset, length, records)
+
+    def range(self, start, end=None, records=False):
+        """Yield keys from start (inclusive) to end (exclusive) in key order,
+        (key, record) if records is True.
+        """
+        start = self._md._sort_key(start.encode('UTF-8'))
+        if end is not None:
+            end = self._md._sort_key(end.encode('UTF-8'))
+        for key, offset, length in self._scan_keys(start, lambda sort_key: end is None or sort_key < end):
+            yield self._scan_result(key, offset, length, records)
+
+    def fuzzy(self, word, limit=10, max_distance=2):
+        """Return [(key, distance)] of keys nearest to word by edit distance, ignoring case.
+
+        Index is saved to "<mdx/mdd>.fuzzy" if Dictionary is opened with index.
+        """
+        with self._lock:
+            if self._fuzzy_index is None:
+                self._fuzzy_index = self._load_fuzzy_index()
+        return self._fuzzy_index.search(word, limit, max_distance)
+
+    def _load_front_coded_keys(self):
+        fname = self.source + '.keys'
+        source_stat = self._md._source_stat
+        if self._index:
+            key_list = FrontCodedKeyList.load(fname, source_stat, self._md._sort_key)
+            if key_list is not None and len(key_list) == len(self._md):
+                return key_list
+        key_list = FrontCodedKeyList.build(self._md._ensure_key_list(), sort_key=self._md._sort_key)
+        key_list.key_order = self._md._keys_sorted()
+        if self._index:
+            try:
+                key_list.save(fname, source_stat)
+            except OSError:
+                pass
+        return key_list
+
+    def _load_fuzzy_index(self):
+        fname = self.source + '.fuzzy'
+        source_stat = self._md._source_stat
+        if self._index:
+            fuzzy_index = FuzzyIndex.load(fname, source_stat)
+            if fuzzy_index is not None:
+                return fuzzy_index
+        fuzzy_index = FuzzyIndex.build(key.decode('UTF-8') for key in self._md.keys())
+        if self._index:
+            try:
+                fuzzy_index.save(fname, source_stat)
+            except OSError:
+                pass
+        return fuzzy_index
+
+    def search(self, text, limit=None, records=False):
+        """Yield keys whose record contains all terms of text, (key, record) if records is True.
+
+        Full text index "<mdx>.fts" is created by build_fts().
+        """
+        with self._lock:
+            if self._fts_index is None:
+                fname = self.source + '.fts'
+                self._fts_index = FullTextIndex.load(fname, self._md._source_stat)
+                if self._fts_index is None:
+                    raise RuntimeError('Full text index "%s" is missing or out of date' % fname)
+            # load key list in lazy mode
+            self._md._ensure_key_list()
+        for x in self._fts_index.search(text)[:limit]:
+            key, offset, length = self._key_location(x)
+            yield self._scan_result(key, offset, length, records)
+
+    def _scan_keys(self, start, match):
+        scan = self._md._scan_keys(start, match)
+        while True:
+            # key blocks are shared in lazy mode
+            with self._lock:
+                item = next(scan, None)
+            if item is None:
+                break
+            yield item
+
+    def _scan_result(self, key, offset, length, records):
+        if records:
+            return key.decode('UTF-8'), self.get_record(offset, length)
+        return key.decode('UTF-8')
+
+    def _locate(self, word, normalize):
+        locations = self._md._lookup_key(word.encode('UTF-8'))
+        if locations or not normalize:
+            return locations
+        if self._normalized_index is None:
+            self._normalized_index = self._md._build_key_index(
+                lambda key: normalize_key(key.decode('UTF-8'), self.is_mdd))
+        x = self._normalized_index.get(normalize_key(word, self.is_mdd))
+        if x is None:
+            return []
+        return [self._key_location(x)[1:] for x in ([x] if isinstance(x, int) else x)]
+
+    def _key_location(self, x):
+        """Return (key, record offset, record length) of key at position x in key list"""
+        key_list = self._md._ensure_key_list()
+        offset, key = key_list[x]
+        if (x + 1) < len(key_list):
+            length = key_list[x + 1][0] - offset
+        else:
+            length = -1
+        return key, offset, length
+
+    def get_record(self, offset, length):
+        return get_record(self._md, None, offset, length, self._mmap, self._cache)
+
+
+def meta(source, substyle=False, passcode=None, index=False):
     meta = {}
     if source.endswith('.db'):
         with sqlite3.connect(source) as conn:
@@ -18,22 +306,12 @@ def meta(source, substyle=False, passcode=None):
             for row in c.fetchall():
                 meta[row[0]] = row[1]
     else:
-        if source.endswith('.mdx'):
-            encoding = ''
-            md = MDX(source, encoding, substyle, passcode)
-        if source.endswith('.mdd'):
-            md = MDD(source, passcode)
-        meta['version'] = md._version
-        meta['record'] = len(md)
-        for key, value in md.header.items():
-            # key has been decode from UTF-16 and encode again with UTF-8
-            key = key.decode('UTF-8').lower()
-            value = value.decode('UTF-8')
-            meta[key] = value
+        with Dictionary(source, substyle, passcode, index) as d:
+            meta = d.meta()
     return meta
 
 
-def get_keys(source, substyle=False, passcode=None):
+def get_keys(source, substyle=False, passcode=None, index=False):
     if source.endswith('.db'):
         with sqlite3.connect(source) as conn:
             c = conn.execute('SELECT entry FROM mdx')
@@ -43,78 +321,75 @@ def get_keys(source, substyle=False, passcode=None):
             for row in c.fetchall():
                 yield row[0]
     else:
-        if source.endswith('.mdx'):
-            encoding = ''
-            md = MDX(source, encoding, substyle, passcode)
-        if source.endswith('.mdd'):
-            md = MDD(source, passcode)
-        for k in md.keys():
-            yield k.decode('UTF-8')
-
-
-def get_record(md, key, offset, length):
-    if md._version >= 3:
-        return get_record_v3(md, key, offset, length)
-    else:
-        return get_record_v1v2(md, key, offset, length)
-
-
-def get_record_v3(md, key, offset, length):
-    f = open(md._fname, 'rb')
-    f.seek(md._record_block_offset)
+        with Dictionary(source, substyle, passcode, index) as d:
+            yield from d.keys()
 
-    num_record_blocks = md._read_int32(f)
-    num_bytes = md._read_number(f)
 
-    decompressed_offset = 0
-    for j in range(num_record_blocks):
-        decompressed_size = md._read_int32(f)
-        compressed_size = md._read_int32(f)
+def get_record(md, key, offset, length, buf=None, cache=None):
+    index, block_offset, compressed_size, decompressed_offset, decompressed_size = \
+        md._locate_record_block(offset)
+    record_block = get_record_block(md, index, buf, cache)
+    return get_record_from_block(md, record_block, offset - decompressed_offset, length)
 
-        if (decompressed_offset + decompressed_size) > offset:
-            break
-        decompressed_offset += decompressed_size
-        f.seek(compressed_size, 1)
 
-    block_compressed = f.read(compressed_size)
-    record_block = md._decode_block(block_compressed, decompressed_size)
-
-    record_start = offset - decompressed_offset
+def get_record_from_block(md, record_block, record_start, length):
     if length > 0:
         record_null = record_block[record_start:record_start + length]
     else:
         record_null = record_block[record_start:]
-    f.close()
     if md._fname.endswith('.mdd'):
         return record_null
     else:
         return record_null.strip().decode(md._encoding)
 
 
+def get_record_block(md, index, buf=None, cache=None):
+    """return decompressed record block, recently used blocks are shared in cache
+
+    buf: opened file content, such as mmap. file will be opened if None
+    cache: BlockCache, default is RECORD_BLOCK_CACHE
+    """
+    if cache is None:
+        cache = RECORD_BLOCK_CACHE
+    # file may be rewritten while the process runs, blocks of the old one are not used
+    cache_key = (md._fname, md._source_stat, index)
+    record_block = cache.get(cache_key)
+    if record_block is not None:
+        return record_block
+    if md._record_block_index is None:
+        md._record_block_index = md._read_record_block_index()
+    block_offsets, compressed_sizes, decompressed_offsets = md._record_block_index
+    decompressed_size = decompressed_offsets[index + 1] - decompressed_offsets[index]
+    if buf is None:
+        with open(md._fname, 'rb') as f:
+            f.seek(block_offsets[index])
+            block_compressed = f.read(compressed_sizes[index])
+    else:
+        block_compressed = buf[block_offsets[index]:block_offsets[index] + compressed_sizes[index]]
+    if md._version >= 3:
+        record_block = get_record_block_v3(md, block_compressed, decompressed_size)
+    else:
+        record_block = get_record_block_v1v2(md, block_compressed, decompressed_size)
+    if record_block is not None:
+        cache.put(cache_key, record_block)
+    return record_block
+
+
+def get_record_v3(md, key, offset, length):
+    """record of MDict 3.0 file, it is same as get_record()"""
+    return get_record(md, key, offset, length)
+
+
 def get_record_v1v2(md, key, offset, length):
-    f = open(md._fname, 'rb')
-    f.seek(md._record_block_offset)
-
-    num_record_blocks = md._read_number(f)
-    num_entries = md._read_number(f)
-    assert(num_entries == md._num_entries)
-    record_block_info_size = md._read_number(f)
-    # record_block_size =
-    md._read_number(f)
-
-    # record block info section
-    compressed_offset = f.tell() + record_block_info_size
-    decompressed_offset = 0
-    for i in range(num_record_blocks):
-        compressed_size = md._read_number(f)
-        decompressed_size = md._read_number(f)
-        if (decompressed_offset + decompressed_size) > offset:
-            break
-        decompressed_offset += decompressed_size
-        compressed_offset += compressed_size
-
-    f.seek(compressed_offset)
-    block_compressed = f.read(compressed_size)
+    """record of MDict 1.x and 2.x file, it is same as get_record()"""
+    return get_record(md, key, offset, length)
+
+
+def get_record_block_v3(md, block_compressed, decompressed_size):
+    return md._decode_block(block_compressed, decompressed_size)
+
+
+def get_record_block_v1v2(md, block_compressed, decompressed_size):
     block_type = block_compressed[:4]
     adler32 = struct.unpack('>I', block_compressed[4:8])[0]
     # no compression
@@ -123,18 +398,7 @@ def get_record_v1v2(md, key, offset, length):
     # lzo compression
     elif block_type == b'\x01\x00\x00\x00':
         # LZO compression is used for engine version < 2.0
-        try:
-            from .base import lzo
-        except ImportError:
-            lzo = None
-            print("LZO compression support is not available")
-            return
-        # decompress
-        # standard lzo (python-lzo) of c version
-        # header = b'\xf0' + struct.pack('>I', decompressed_size)
-        # record_block = lzo.decompress(header + block_compressed[8:])
-        # lzo of python version, no header!!!
-        record_block = lzo.decompress(block_compressed[8:], initSize=decompressed_size, blockSize=1308672)
+        record_block = lzo.decompress(block_compressed[8:], decompressed_size)
     # zlib compression
     elif block_type == b'\x02\x00\x00\x00':
         # decompress
@@ -142,58 +406,111 @@ def get_record_v1v2(md, key, offset, length):
     # notice that adler32 return signed value
     assert(adler32 == zlib.adler32(record_block) & 0xffffffff)
     assert(len(record_block) == decompressed_size)
-
-    record_start = offset - decompressed_offset
-    if length > 0:
-        record_null = record_block[record_start:record_start + length]
-    else:
-        record_null = record_block[record_start:]
-    f.close()
-    if md._fname.endswith('.mdd'):
-        return record_null
-    else:
-        return record_null.strip().decode(md._encoding)
+    return record_block
 
 
-def query(source, word, substyle=False, passcode=None):
+def query(source, word, substyle=False, passcode=None, index=False, lazy=False, fts=False, normalize=False):
+    """fts: full text search in sqlite3 DB which is unpacked with fts
+    normalize: lookup again ignoring case, accents and punctuation if word is not found
+    """
     record = []
     if source.endswith('.db'):
         with sqlite3.connect(source) as conn:
-            c = conn.execute('SELECT * FROM mdx WHERE entry=?', (word, ))
-            for row in c.fetchall():
-                record.append(row[1])
-            if not record:
-                c = conn.execute('SELECT * FROM mdd WHERE entry=?', (word, ))
-                for row in c.fetchall():
-                    return row[1]
+            if fts:
+                return '\n---\n'.join(record for entry, record in query_db_fts(conn, word))
+            return query_db(conn, word)
     else:
-        if source.endswith('.mdx'):
-            encoding = ''
-            md = MDX(source, encoding, substyle, passcode)
+        with Dictionary(source, substyle, passcode, index, lazy) as d:
+            record = d.lookup(word, normalize)
         if source.endswith('.mdd'):
-            md = MDD(source, passcode)
-        word = word.encode('UTF-8')
-        for x in range(len(md._key_list)):
-            offset, key = md._key_list[x]
-            if word == key:
-                if (x + 1) < len(md._key_list):
-                    length = md._key_list[x + 1][0] - offset
-                else:
-                    length = -1
-                record.append(get_record(md, key, offset, length))
-        if md._fname.endswith('.mdd'):
             if record:
                 return record[0]
     return '\n---\n'.join(record)
 
 
-def unpack(target, source, split=None, convert_chtml=False, substyle=False, passcode=None):
+def prefix(source, word, limit=None, substyle=False, passcode=None, index=False, lazy=False):
+    with Dictionary(source, substyle, passcode, index, lazy) as d:
+        yield from d.prefix(word, limit)
+
+
+def fuzzy(source, word, limit=10, max_distance=2, substyle=False, passcode=None, index=False):
+    with Dictionary(source, substyle, passcode, index) as d:
+        return d.fuzzy(word, limit, max_distance)
+
+
+def search(source, text, limit=None, substyle=False, passcode=None, index=False):
+    if source.endswith('.db'):
+        with sqlite3.connect(source) as conn:
+            for entry, record in query_db_fts(conn, text, limit):
+                yield entry
+    else:
+        with Dictionary(source, substyle, passcode, index) as d:
+            yield from d.search(text, limit)
+
+
+def build_fts(source, substyle=False, passcode=None):
+    """Build full text index "<mdx>.fts" of MDX records"""
+    mdx = MDX(source, '', substyle, passcode)
+    bar = tqdm(total=len(mdx), unit='rec')
+    fts_index = FullTextIndex.build(
+        (value.decode('UTF-8', errors='ignore') for key, value in mdx.items()),
+        callback=bar.update)
+    fts_index.save(source + '.fts', mdx._source_stat)
+    bar.close()
+    return fts_index
+
+
+def query_db(conn, word):
+    record = []
+    c = conn.execute('SELECT * FROM mdx WHERE entry=?', (word, ))
+    for row in c.fetchall():
+        record.append(row[1])
+    if not record:
+        c = conn.execute('SELECT * FROM mdd WHERE entry=?', (word, ))
+        for row in c.fetchall():
+            return row[1]
+    return '\n---\n'.join(record)
+
+
+def query_db_fts(conn, text, limit=None):
+    """Return [(entry, paraphrase)] whose paraphrase contains all words of text, best match first"""
+    # quote every word, FTS5 query syntax is not used
+    match = ' '.join('"%s"' % word.replace('"', '""') for word in text.split())
+    sql = ('SELECT mdx.entry, mdx.paraphrase FROM mdx_fts JOIN mdx ON mdx.rowid = mdx_fts.rowid '
+           'WHERE mdx_fts MATCH ? ORDER BY mdx_fts.rank')
+    if limit is not None:
+        sql += ' LIMIT %d' % limit
+    result = []
+    for entry, paraphrase in conn.execute(sql, (match,)):
+        if isinstance(paraphrase, bytes):
+            paraphrase = zlib.decompress(paraphrase).decode('UTF-8')
+        result.append((entry, paraphrase))
+    return result
+
+
+def query_many(source, words, substyle=False, passcode=None, index=False, lazy=False, normalize=False):
+    """Yield (word, record) in order of words, record is the same as query()"""
+    if source.endswith('.db'):
+        with sqlite3.connect(source) as conn:
+            for word in words:
+                yield word, query_db(conn, word)
+    else:
+        with Dictionary(source, substyle, passcode, index, lazy) as d:
+            for word, record in d.lookup_many(words, normalize):
+                if d.is_mdd:
+                    yield word, record[0] if record else ''
+                else:
+                    yield word, '\n---\n'.join(record)
+
+
+def unpack(target, source, split=None, convert_chtml=False, substyle=False, passcode=None, workers=None):
+    """workers: number of processes to decode key blocks and threads to decode record blocks"""
     target = target or './'
     if not os.path.exists(target):
         os.makedirs(target)
     if source.endswith('.mdx'):
         encoding = ''
-        mdx = MDX(source, encoding, substyle, passcode)
+        mdx = MDX(source, encoding, substyle, passcode, workers=workers)
         bar = tqdm(total=len(mdx), unit='rec')
         basename = os.path.basename(source)
         # write header
@@ -244,7 +561,7 @@ def unpack(target, source, split=None, convert_chtml=False, substyle=False, pass
             raise ValueError('split value: %s' % split)
         item_count = 0
         part_count = 1
-        for key, value in mdx.items():
+        for key, value in mdx.items(workers):
             if not value.strip():
                 bar.write('Skip entry: %s' % key)
                 continue
@@ -274,9 +591,9 @@ def unpack(target, source, split=None, convert_chtml=False, substyle=False, pass
         datafolder = os.path.abspath(target)
         if not os.path.exists(datafolder):
             os.makedirs(datafolder)
-        mdd = MDD(source, passcode)
+        mdd = MDD(source, passcode, workers=workers)
         bar = tqdm(total=len(mdd), unit='rec')
-        for key, value in mdd.items():
+        for key, value in mdd.items(workers):
             fname = key.decode('UTF-8').replace('\\', os.path.sep)
             dfname = datafolder + fname
             if not os.path.exists(os.path.dirname(dfname)):
@@ -288,7 +605,10 @@ def unpack(target, source, split=None, convert_chtml=False, substyle=False, pass
         bar.close()
 
 
-def unpack_to_db(target, source, encoding='', substyle=False, passcode=None, zip=True):
+def unpack_to_db(target, source, encoding='', substyle=False, passcode=None, zip=True, fts=False, workers=None):
+    """fts: create FTS5 table "mdx_fts" of paraphrase without HTML tags, rowid is the same as "mdx"
+    workers: number of processes to decode key blocks and threads to decode record blocks
+    """
     target = target or './'
     if not os.path.exists(target):
         os.makedirs(target)
@@ -296,7 +616,7 @@ def unpack_to_db(target, source, encoding='', substyle=False, passcode=None, zip
     db_name = os.path.join(target, name + '.db')
     with sqlite3.connect(db_name) as conn:
         if source.endswith('.mdx'):
-            mdx = MDX(source, encoding, substyle, passcode)
+            mdx = MDX(source, encoding, substyle, passcode, workers=workers)
 
             conn.execute('DROP TABLE IF EXISTS meta')
             conn.execute('CREATE TABLE meta (key TEXT NOT NULL, value TEXT NOT NULL)')
@@ -306,6 +626,7 @@ def unpack_to_db(target, source, encoding='', substyle=False, passcode=None, zip
                 value = '\r\n'.join(value.decode(mdx._encoding).splitlines())
                 meta[key] = value
             meta['zip'] = zip
+            meta['fts'] = fts
             conn.executemany('INSERT INTO meta VALUES (?,?)', meta.items())
             conn.commit()
 
@@ -319,7 +640,7 @@ def unpack_to_db(target, source, encoding='', substyle=False, passcode=None, zip
             max_batch = 1024
             count = 0
             entries = []
-            for key, value in mdx.items():
+            for key, value in mdx.items(workers):
                 if not value.strip():
                     continue
                 count += 1
@@ -341,14 +662,28 @@ def unpack_to_db(target, source, encoding='', substyle=False, passcode=None, zip
             bar.close()
             conn.execute('CREATE INDEX mdx_entry_index ON mdx (entry)')
 
+            conn.execute('DROP TABLE IF EXISTS mdx_fts')
+            if fts:
+                def paraphrase_text(value):
+                    if isinstance(value, bytes):
+                        value = zlib.decompress(value).decode(mdx._encoding)
+                    return strip_html(value)
+
+                # contentless table, text is read from "mdx"
+                conn.execute("CREATE VIRTUAL TABLE mdx_fts USING fts5(paraphrase, content='')")
+                conn.create_function('paraphrase_text', 1, paraphrase_text)
+                conn.execute('INSERT INTO mdx_fts (rowid, paraphrase) '
+                             'SELECT rowid, paraphrase_text(paraphrase) FROM mdx')
+                conn.commit()
+
         elif source.endswith('.mdd'):
             conn.execute('DROP TABLE IF EXISTS mdd')
             conn.execute('CREATE TABLE mdd (entry TEXT NOT NULL, file BLOB NOT NULL)')
-            mdd = MDD(source, passcode)
+            mdd = MDD(source, passcode, workers=workers)
             bar = tqdm(total=len(mdd), unit='rec')
             max_batch = 1024 * 1024 * 10
             count = 0
-            for key, value in mdd.items():
+            for key, value in mdd.items(workers):
                 count += len(value)
                 key = key.decode('UTF-8').lower()
                 conn.execute('INSERT INTO mdd VALUES (?,?)', (key, value))
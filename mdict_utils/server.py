@@ -0,0 +1,135 @@
+import asyncio
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from .reader import Dictionary
+
+
+class LookupServer(object):
+    """HTTP server for MDX entries and MDD resources.
+
+    GET /entry/<word>       records of word in MDX, in HTML
+    GET /resource/<path>    file in MDD, such as /resource/images/a.png
+    """
+    def __init__(self, mdx, mdds=None, substyle=False, passcode=None, index=False, workers=None,
+                 compact=False):
+        self._mdx = Dictionary(mdx, substyle, passcode, index, compact=compact)
+        self._mdds = [Dictionary(mdd, passcode=passcode, index=index, compact=compact)
+                      for mdd in mdds or []]
+        for d in [self._mdx] + self._mdds:
+            d.preload()
+        # decompression is done in threads, zlib releases GIL
+        self._executor = ThreadPoolExecutor(workers)
+
+    def close(self):
+        self._executor.shutdown()
+        for d in [self._mdx] + self._mdds:
+            d.close()
+
+    def lookup_entry(self, word):
+        record = self._mdx.lookup(word, normalize=True)
+        if not record:
+            return None
+        # record text ends with NUL in MDX
+        record = [text.rstrip('\0') for text in record]
+        return '\n---\n'.join(record).encode('utf-8'), 'text/html; charset=utf-8'
+
+    def lookup_resource(self, path):
+        # key of MDD is windows path, such as "\images\a.png"
+        key = '\\' + path.replace('/', '\\').lstrip('\\')
+        for mdd in self._mdds:
+            record = mdd.lookup(key, normalize=True)
+            if record:
+                content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                return record[0], content_type
+        return None
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, close=True,
+                                     head=request_line.startswith(b'HEAD '))
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                # request body is not used
+                length = int(headers.get('content-length', 0) or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                connection = headers.get('connection', '').lower()
+                if version == 'HTTP/1.0':
+                    close = connection != 'keep-alive'
+                else:
+                    close = connection == 'close'
+                # response of HEAD has headers only, body of error too
+                head = method == 'HEAD'
+
+                if method not in ('GET', 'HEAD'):
+                    await self._send(writer, HTTPStatus.METHOD_NOT_ALLOWED, close=close, head=head)
+                else:
+                    path = unquote(target.split('?', 1)[0])
+                    result = None
+                    if path.startswith('/entry/'):
+                        result = await loop.run_in_executor(
+                            self._executor, self.lookup_entry, path[len('/entry/'):])
+                    elif path.startswith('/resource/'):
+                        result = await loop.run_in_executor(
+                            self._executor, self.lookup_resource, path[len('/resource/'):])
+                    if result is None:
+                        await self._send(writer, HTTPStatus.NOT_FOUND, close=close, head=head)
+                    else:
+                        body, content_type = result
+                        await self._send(writer, HTTPStatus.OK, body, content_type,
+                                         close=close, head=head)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, body=None, content_type='text/plain; charset=utf-8',
+                    close=False, head=False):
+        if body is None:
+            body = status.phrase.encode('utf-8')
+        headers = [
+            'HTTP/1.1 %d %s' % (status.value, status.phrase),
+            'Content-Type: %s' % content_type,
+            'Content-Length: %d' % len(body),
+            'Connection: %s' % ('close' if close else 'keep-alive'),
+        ]
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        if not head:
+            writer.write(body)
+        await writer.drain()
+
+    async def serve_forever(self, host='127.0.0.1', port=8000):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(mdx, mdds=None, host='127.0.0.1', port=8000, **kwargs):
+    server = LookupServer(mdx, mdds, **kwargs)
+    print('Serving "%s" on http://%s:%s/' % (mdx, host, port))
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -1,5 +1,7 @@
 
+import threading
 import timeit
+from collections import OrderedDict
 
 
 class ElapsedTimer(object):
@@ -26,3 +28,60 @@ class ElapsedTimer(object):
         if not hasattr(self, 'secs'):
             self._end()
         print(('--- Elapsed time: %f seconds ---' % (self.secs)).center(80))
+
+
+class BlockCache(object):
+    """LRU cache of decompressed blocks, bounded by total bytes.
+
+    capacity: max bytes of all cached blocks
+    """
+    def __init__(self, capacity=64 * 1024 * 1024):
+        self.capacity = capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def get(self, key):
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(key)
+            return block
+
+    def put(self, key, block):
+        with self._lock:
+            if len(block) > self.capacity:
+                return
+            old = self._blocks.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._blocks[key] = block
+            self.size += len(block)
+            while self.size > self.capacity:
+                _, old = self._blocks.popitem(last=False)
+                self.size -= len(old)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'blocks': len(self._blocks),
+            'size': self.size,
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
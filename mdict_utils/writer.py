@@ -1,23 +1,36 @@
 
 import re
+import sys
 import string
 import sqlite3
 import struct
 import os.path
-import functools
-import locale
+import heapq
+import pickle
+import tempfile
 import zlib
 import datetime
+from array import array
+from collections import deque
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 from html import escape
 
 from tqdm import tqdm
 
 from .base.writemdict import MDictWriter as MDictWriterBase, \
     _MdxRecordBlock as _MdxRecordBlockBase,  \
-    _OffsetTableEntry as _OffsetTableEntryBase
+    _OffsetTable as _OffsetTableBase, \
+    _MdxKeyBlock, _mdx_compress
 
 
 MDICT_OBJ = {}
+# entries are pickled in chunks in temporary files
+SPILL_CHUNK = 4096
+# approximate bytes of entry tuple and numbers, besides keys and path
+ENTRY_OVERHEAD = 128
+
+regex_strip = re.compile('[%s ]+' % string.punctuation)
 
 
 def get_record_null(mdict_file, key, pos, size, encoding, is_mdd):
@@ -59,44 +72,213 @@ def get_record_null(mdict_file, key, pos, size, encoding, is_mdd):
     return b''
 
 
-class _OffsetTableEntry(_OffsetTableEntryBase):
-    def __init__(self, key0, key, key_null, key_len, offset,
-                 record_pos, record_null, record_size, encoding, is_mdd):
-        super(_OffsetTableEntry, self).__init__(
-            key, key_null, key_len, offset, record_null)
-        self.key0 = key0
-        self.record_pos = record_pos
-        self.record_size = record_size
-        self.encoding = encoding
-        self.is_mdd = is_mdd
-
-    def get_record_null(self):
+class _OffsetTable(_OffsetTableBase):
+    """
+    Records are not kept in memory, they are read from source file when record blocks are built.
+    Source paths are stored once, every entry has path number, record position and size.
+    """
+    def __init__(self, encoding, encoding_length, is_mdd, offset=0):
+        super(_OffsetTable, self).__init__(encoding_length, offset)
+        self._encoding = encoding
+        self._encoding_length = encoding_length
+        self._is_mdd = is_mdd
+        self._paths = []
+        self._path_index = {}
+        self.path_number = array('L')
+        self.record_pos = array('Q')
+
+    def append(self, key, path, pos, size):
+        key_null = (key + "\0").encode(self._encoding)
+        self._append_key(key_null, len(key_null) // self._encoding_length - 1, size)
+        index = self._path_index.get(path)
+        if index is None:
+            index = self._path_index[path] = len(self._paths)
+            self._paths.append(path)
+        self.path_number.append(index)
+        self.record_pos.append(pos)
+
+    def record_null(self, i):
         return get_record_null(
-            self.record_null, self.key0,
-            self.record_pos, self.record_size, self.encoding, self.is_mdd)
+            self._paths[self.path_number[i]], self.key(i).decode(self._encoding),
+            self.record_pos[i], self.record_size[i], self._encoding, self._is_mdd)
+
+
+def mdict_sort_key(is_mdd=False):
+    """
+    Return key function to sort keys following mdict standard.
+    Keys are compared in lower case, punctuation and space are ignored for MDX.
+    It does not depend on locale, keys are ordered by code point like locale.strxfrm in C locale.
+    """
+    if is_mdd:
+        return str.lower
+
+    def sort_key(key):
+        return regex_strip.sub('', key.lower())
+    return sort_key
+
+
+def _dump_entries(f, entries):
+    for x in range(0, len(entries), SPILL_CHUNK):
+        pickle.dump(entries[x:x + SPILL_CHUNK], f, pickle.HIGHEST_PROTOCOL)
+
+
+def _load_entries(f):
+    f.seek(0)
+    while True:
+        try:
+            entries = pickle.load(f)
+        except EOFError:
+            return
+        yield from entries
+
+
+class _SortedRuns(object):
+    """
+    Sort entries with bounded memory.
+    Runs of (sort key, key, path, pos, size) are sorted in memory bytes and spilled to
+    temporary files, iteration merges the runs and yields (key, path, pos, size).
+    The last run is kept in memory.
+    """
+    def __init__(self, items, sort_key, memory):
+        self._files = []
+        self._run = []
+        self._count = 0
+        run_size = 0
+        for item in items:
+            key = item['key']
+            entry = (sort_key(key), key, item['path'], item['pos'], item['size'])
+            self._run.append(entry)
+            self._count += 1
+            # path is shared by records of txt file, so it is overestimated
+            run_size += sys.getsizeof(entry[0]) + sys.getsizeof(key) + sys.getsizeof(entry[2]) \
+                + ENTRY_OVERHEAD
+            if run_size >= memory:
+                self._spill()
+                run_size = 0
+        self._run.sort(key=itemgetter(0))
+
+    def __len__(self):
+        return self._count
+
+    def _spill(self):
+        self._run.sort(key=itemgetter(0))
+        f = tempfile.TemporaryFile()
+        _dump_entries(f, self._run)
+        self._files.append(f)
+        self._run = []
+
+    def __iter__(self):
+        """merge runs, entries with same key keep input order"""
+        runs = [_load_entries(f) for f in self._files] + [self._run]
+        try:
+            for entry in heapq.merge(*runs, key=itemgetter(0)):
+                yield entry[1:]
+        finally:
+            for f in self._files:
+                f.close()
+            self._files = []
+            self._run = []
+
+
+class _StreamOffsetTable(object):
+    """
+    Offset table in temporary file for entries which do not fit in memory.
+    Entries are saved in key order, blocks are built with small _OffsetTable of their entries.
+    """
+    def __init__(self, entries, make_table):
+        self._make_table = make_table
+        self._file = tempfile.TemporaryFile()
+        self._count = 0
+        self.total_record_len = 0
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            self._count += 1
+            self.total_record_len += entry[3]
+            if len(chunk) >= SPILL_CHUNK:
+                _dump_entries(self._file, chunk)
+                chunk = []
+        _dump_entries(self._file, chunk)
+
+    def __len__(self):
+        return self._count
+
+    def blocks(self, block_type, block_size, compression_type, version):
+        """Yield blocks of block_type like MDictWriter._split_blocks"""
+        table = self._make_table(0)
+        size = 0
+        for entry in _load_entries(self._file):
+            table.append(*entry)
+            i = len(table) - 1
+            entry_size = block_type._len_block_entry(table, i)
+            if i and size + entry_size > block_size:
+                yield block_type(table, 0, i, compression_type, version)
+                # entry i starts next block
+                table = self._make_table(table.offset[i])
+                table.append(*entry)
+                size = 0
+            size += entry_size
+        if len(table):
+            yield block_type(table, 0, len(table), compression_type, version)
+
+    def close(self):
+        self._file.close()
+
+
+class _StreamRecordBlocks(object):
+    """Record blocks of _StreamOffsetTable, records are read when blocks are iterated"""
+    def __init__(self, offset_table, block_size, compression_type, version):
+        self._offset_table = offset_table
+        self._block_size = block_size
+        self._compression_type = compression_type
+        self._version = version
+        self._count = sum(1 for _ in self)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return self._offset_table.blocks(
+            _MdxRecordBlock, self._block_size, self._compression_type, self._version)
 
 
 class _MdxRecordBlock(_MdxRecordBlockBase):
-    def __init__(self, offset_table, compression_type, version):
+    def __init__(self, offset_table, start, end, compression_type, version):
         self._offset_table = offset_table
+        self._start = start
+        self._end = end
         self._compression_type = compression_type
         self._version = version
 
+    def __len__(self):
+        return self._end - self._start
+
+    def fetch(self):
+        """read records of block, it is not thread safe"""
+        t = self._offset_table
+        return b''.join(self._block_entry(t, i, self._version) for i in range(self._start, self._end))
+
+    def compress(self, decomp_data):
+        """compress block data, it could run in thread"""
+        self._decomp_size = len(decomp_data)
+        self._comp_data = _mdx_compress(decomp_data, self._compression_type)
+        self._comp_size = len(self._comp_data)
+        return self
+
     def prepare(self):
-        super(_MdxRecordBlock, self).__init__(
-            self._offset_table, self._compression_type, self._version)
+        self.compress(self.fetch())
 
     def clean(self):
         if self._comp_data:
             self._comp_data = None
 
     @staticmethod
-    def _block_entry(t, version):
-        return t.get_record_null()
+    def _block_entry(t, i, version):
+        return t.record_null(i)
 
     @staticmethod
-    def _len_block_entry(t):
-        return t.record_size
+    def _len_block_entry(t, i):
+        return t.record_size[i]
 
 
 class MDictWriter(MDictWriterBase):
@@ -110,9 +292,20 @@ class MDictWriter(MDictWriterBase):
                  register_by=None,
                  user_email=None,
                  user_device_id=None,
-                 is_mdd=False):
+                 is_mdd=False,
+                 jobs=None,
+                 memory=None):
+        """
+        jobs: number of threads to compress record blocks
+        memory: bytes of memory to sort entries. if it is set, d could be any iterable,
+                entries are sorted in temporary files and not kept in memory.
+        """
         self._key_block_size = key_size
         self._record_block_size = record_size
+        self._jobs = jobs
+        self._memory = memory
+        if memory:
+            d = _SortedRuns(d, mdict_sort_key(is_mdd), memory)
         # disable encrypt
         super(MDictWriter, self).__init__(
             d, title, description,
@@ -124,69 +317,41 @@ class MDictWriter(MDictWriterBase):
 
     def _build_offset_table(self, items):
         """One key own multi entry, so d is list"""
-        def mdict_cmp(item1, item2):
-            # sort following mdict standard
-            key1 = item1['key'].lower()
-            key2 = item2['key'].lower()
-            if not self._is_mdd:
-                key1 = regex_strip.sub('', key1)
-                key2 = regex_strip.sub('', key2)
-            # locale key
-            key1 = locale.strxfrm(key1)
-            key2 = locale.strxfrm(key2)
-            if key1 > key2:
-                return 1
-            elif key1 < key2:
-                return -1
-            # reverse
-            if len(key1) > len(key2):
-                return -1
-            elif len(key1) < len(key2):
-                return 1
-            key1 = key1.rstrip(string.punctuation)
-            key2 = key2.rstrip(string.punctuation)
-            if key1 > key2:
-                return -1
-            elif key1 < key2:
-                return 1
-            return 0
-
-        pattern = '[%s ]+' % string.punctuation
-        regex_strip = re.compile(pattern)
-
-        items.sort(key=functools.cmp_to_key(mdict_cmp))
-
-        self._offset_table = []
-        offset = 0
+        if self._memory:
+            # items are sorted in runs, offset table is kept in temporary file
+            self._offset_table = _StreamOffsetTable(items, self._new_offset_table)
+            self._total_record_len = self._offset_table.total_record_len
+            return
+
+        # sort key of every item is computed once
+        sort_key = mdict_sort_key(self._is_mdd)
+        items.sort(key=lambda item: sort_key(item['key']))
+
+        self._offset_table = self._new_offset_table()
         for record in items:
-            key = record['key']
-            key_enc = key.encode(self._python_encoding)
-            key_null = (key + "\0").encode(self._python_encoding)
-            key_len = len(key_enc) // self._encoding_length
-
-            self._offset_table.append(_OffsetTableEntry(
-                key0=record['key'],
-                key=key_enc,
-                key_null=key_null,
-                key_len=key_len,
-                record_null=record['path'],
-                record_size=record['size'],
-                record_pos=record['pos'],
-                offset=offset,
-                encoding=self._python_encoding,
-                is_mdd=self._is_mdd,
-            ))
-            offset += record['size']
-        self._total_record_len = offset
+            self._offset_table.append(record['key'], record['path'], record['pos'], record['size'])
+        self._total_record_len = self._offset_table.end_offset
+
+    def _new_offset_table(self, offset=0):
+        return _OffsetTable(self._python_encoding, self._encoding_length, self._is_mdd, offset)
 
     def _build_key_blocks(self):
         # Sets self._key_blocks to a list of _MdxKeyBlocks.
         self._block_size = self._key_block_size
-        super(MDictWriter, self)._build_key_blocks()
+        if self._memory:
+            # key blocks only keep compressed keys
+            self._key_blocks = list(self._offset_table.blocks(
+                _MdxKeyBlock, self._block_size, self._compression_type, self._version))
+        else:
+            super(MDictWriter, self)._build_key_blocks()
         self._block_size = self._record_block_size
 
     def _build_record_blocks(self):
-        self._record_blocks = self._split_blocks(_MdxRecordBlock)
+        if self._memory:
+            self._record_blocks = _StreamRecordBlocks(
+                self._offset_table, self._block_size, self._compression_type, self._version)
+        else:
+            self._record_blocks = self._split_blocks(_MdxRecordBlock)
 
     def _build_recordb_index(self):
         pass
@@ -206,12 +371,11 @@ class MDictWriter(MDictWriterBase):
 
         recordblocks_total_size = 0
         recordb_index = []
-        for b in self._record_blocks:
-            b.prepare()
+        for b in self._prepare_record_blocks():
             recordblocks_total_size += len(b.get_block())
             recordb_index.append(b.get_index_entry())
             outfile.write(b.get_block())
-            callback and callback(len(b._offset_table))
+            callback and callback(len(b))
             b.clean()
         end_pos = outfile.tell()
         self._recordb_index = b''.join(recordb_index)
@@ -226,11 +390,35 @@ class MDictWriter(MDictWriterBase):
         outfile.write(self._recordb_index)
         outfile.seek(end_pos)
 
+    def _prepare_record_blocks(self):
+        """
+        Yield compressed record blocks in order.
+        Records are read in this thread, blocks are compressed by jobs threads.
+        At most 2 blocks per job are in flight.
+        """
+        if not self._jobs or self._jobs < 2:
+            for b in self._record_blocks:
+                b.prepare()
+                yield b
+            return
+        pending = deque()
+        with ThreadPoolExecutor(self._jobs) as executor:
+            for b in self._record_blocks:
+                pending.append(executor.submit(b.compress, b.fetch()))
+                if len(pending) >= self._jobs * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
     def write(self, outfile, callback=None):
         self._write_header(outfile)
         self._write_key_sect(outfile)
         self._write_record_sect(outfile, callback=callback)
 
+    def close(self):
+        if self._memory:
+            self._offset_table.close()
+
     def _write_header(self, f):
         # disable encrypt
         encrypted = "No"
@@ -302,20 +490,34 @@ class MDictWriter(MDictWriterBase):
         f.write(struct.pack(b"<L", zlib.adler32(header_string) & 0xffffffff))
 
 
+# compression name: (compression type, engine version)
+# LZO is for engine version 1.2, which old devices use
+COMPRESSION = {
+    'none': (0, '2.0'),
+    'lzo': (1, '1.2'),
+    'zlib': (2, '2.0'),
+}
+
+
 def pack(target, dictionary, title='', description='',
-         key_size=32768, record_size=65536, encoding='UTF-8', is_mdd=False):
+         key_size=32768, record_size=65536, encoding='UTF-8', is_mdd=False, compression='zlib',
+         jobs=None, memory=None):
+    """memory: bytes of memory to sort entries, dictionary could be an iterator if it is set"""
     def callback(value):
         bar.update(value)
 
+    compression_type, version = COMPRESSION[compression]
     writer = MDictWriter(
         dictionary, title=title, description=description,
         key_size=key_size, record_size=record_size,
         encoding=encoding, is_mdd=is_mdd,
+        compression_type=compression_type, version=version, jobs=jobs, memory=memory,
     )
     bar = tqdm(total=len(writer._offset_table), unit='rec')
     outfile = open(target, "wb")
     writer.write(outfile, callback=callback)
     outfile.close()
+    writer.close()
     bar.close()
 
 
@@ -391,40 +593,48 @@ def db2txt(source, encoding='UTF-8', zip=False, callback=None):
 
 
 def pack_mdx_db(source, encoding='UTF-8', callback=None):
-    dictionary = []
+    return list(iter_mdx_db(source, encoding, callback))
+
+
+def iter_mdx_db(source, encoding='UTF-8', callback=None):
     sql = 'SELECT entry, paraphrase, rowid FROM mdx'
     with sqlite3.connect(source) as conn:
         cur = conn.execute(sql)
         for c in cur:
-            dictionary.append({
+            yield {
                 'key': c[0],
                 'pos': c[2],
                 'path': source,
                 'size': len((c[1] + '\0').encode(encoding)),
-            })
+            }
             callback and callback(1)
-    return dictionary
 
 
 def pack_mdd_db(source, callback=None):
-    dictionary = []
+    return list(iter_mdd_db(source, callback))
+
+
+def iter_mdd_db(source, callback=None):
     sql = 'SELECT entry, LENGTH(file), rowid FROM mdd'
     with sqlite3.connect(source) as conn:
         cur = conn.execute(sql)
         for c in cur:
-            dictionary.append({
+            yield {
                 'key': c[0],
                 'pos': c[2],
                 'path': source,
                 'size': c[1],
-            })
+            }
             callback and callback(1)
-    return dictionary
 
 
 def pack_mdx_txt(source, encoding='UTF-8', callback=None, keys=None):
     """return LIST data."""
-    dictionary = []
+    return list(iter_mdx_txt(source, encoding, callback, keys))
+
+
+def iter_mdx_txt(source, encoding='UTF-8', callback=None, keys=None):
+    """yield entries of pack_mdx_txt"""
     sources = []
     null_length = len('\0'.encode(encoding))
     if os.path.isfile(source):
@@ -454,12 +664,12 @@ def pack_mdx_txt(source, encoding='UTF-8', callback=None, keys=None):
                     size = offset - pos + null_length
                     key = key.decode(encoding)
                     if not keys or key in keys:
-                        dictionary.append({
+                        yield {
                             'key': key,
                             'pos': pos,
                             'path': source,
                             'size': size,
-                        })
+                        }
                     key = None
                     callback and callback(1)
                 elif not key:
@@ -469,7 +679,6 @@ def pack_mdx_txt(source, encoding='UTF-8', callback=None, keys=None):
                     offset = f.tell()
 
                 line = f.readline()
-    return dictionary
 
 
 def pack_mdx_txt2(source, encoding='UTF-8'):
@@ -507,19 +716,22 @@ def pack_mdx_txt2(source, encoding='UTF-8'):
 
 
 def pack_mdd_file(source, callback=None):
-    dictionary = []
+    return list(iter_mdd_file(source, callback))
+
+
+def iter_mdd_file(source, callback=None):
     source = os.path.abspath(source)
     if os.path.isfile(source):
         size = os.path.getsize(source)
         key = '\\' + os.path.basename(source)
         if os.sep != '\\':
             key = key.replace(os.sep, '\\')
-        dictionary.append({
+        yield {
             'key': key,
             'pos': 0,
             'path': source,
             'size': size,
-        })
+        }
     else:
         relpath = source
         for root, dirs, files in os.walk(source):
@@ -529,11 +741,10 @@ def pack_mdd_file(source, callback=None):
                 key = '\\' + os.path.relpath(fpath, relpath)
                 if os.sep != '\\':
                     key = key.replace(os.sep, '\\')
-                dictionary.append({
+                yield {
                     'key': key,
                     'pos': 0,
                     'path': fpath,
                     'size': size,
-                })
+                }
                 callback and callback(1)
-    return dictionary
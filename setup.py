@@ -33,5 +33,9 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require={
+        # C library for LZO compression, the pure python version is slow
+        'lzo': ['python-lzo'],
+    },
     zip_safe=False,
 )
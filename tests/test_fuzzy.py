@@ -0,0 +1,59 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from mdict_utils.fuzzy import FuzzyIndex, grams, levenshtein, normalize
+
+
+class FuzzyIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rand = random.Random(7)
+        cls.keys = set(''.join(rand.choice('abcdeß') for _ in range(rand.randint(1, 8)))
+                       for _ in range(1000))
+        cls.keys.update(['Straße', 'STRASSE', ''])
+        cls.index = FuzzyIndex.build(cls.keys)
+
+    def expected(self, word, max_distance):
+        """keys within max_distance, which share a trigram with word"""
+        result = []
+        for key in self.keys:
+            if not grams(word) & grams(key):
+                continue
+            distance = levenshtein(normalize(word), normalize(key), max_distance)
+            if distance <= max_distance:
+                result.append((key, distance))
+        return result
+
+    def check(self, index, word, max_distance):
+        result = index.search(word, limit=None, max_distance=max_distance)
+        self.assertEqual(sorted(result), sorted(self.expected(word, max_distance)))
+        # sorted by distance
+        self.assertEqual([d for k, d in result], sorted(d for k, d in result))
+
+    def test_search(self):
+        rand = random.Random(11)
+        words = ['a', 'ab', 'abc', 'ß', 'strasse', 'bcdeabcdeabc']
+        words += [''.join(rand.choice('abcdeßx') for _ in range(rand.randint(1, 10))) for _ in range(15)]
+        for word in words:
+            for max_distance in (0, 1, 2):
+                self.check(self.index, word, max_distance)
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'test.fuzzy')
+            stat = (1, 2, 3)
+            self.index.save(fname, stat)
+            index = FuzzyIndex.load(fname, stat)
+            self.assertEqual(len(index), len(self.keys))
+            for word in ['ab', 'strasse', 'eeddcc']:
+                self.check(index, word, 2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from mdict_utils import reader, writer
+from mdict_utils.base import lzo
+
+
+# compressed by liblzo LZO1X-1
+LITERALS = bytes(range(256)) + bytes(range(255, -1, -1))
+VECTORS = [
+    (b'hello hello hello hello world, hello hello',
+     bytes.fromhex('1768656c6c6f2030140003776f726c642c2a4800110000')),
+    # match overlaps its output, with extended length
+    (b'a' * 300, bytes.fromhex('126120000b0000110000')),
+    (b'abc' * 100 + b'xyz', bytes.fromhex('146162632000090b0078797a110000')),
+    # literal run with extended length
+    (LITERALS + b'end of literals!!!!!!',
+     bytes.fromhex('0000ff') + LITERALS + b'end of literals!' + bytes.fromhex('8000110000')),
+]
+
+
+def samples():
+    rand = random.Random(1)
+    data = [b'', b'a', b'abcd', b'a' * 100, b'hello world ' * 1000, LITERALS * 3]
+    for _ in range(40):
+        alphabet = bytes(rand.sample(range(256), rand.randint(1, 20)))
+        data.append(bytes(rand.choice(alphabet) for _ in range(rand.randint(0, 3000))))
+    # match over 16 KB back, M4 in LZO1X
+    block = bytes(rand.getrandbits(8) for _ in range(2000))
+    noise = bytes(rand.getrandbits(8) for _ in range(20000))
+    data.append(block + noise + block)
+    return data
+
+
+class DecompressTest(unittest.TestCase):
+    def test_vectors(self):
+        for data, compressed in VECTORS:
+            self.assertEqual(lzo._decompress(compressed, len(data)), data)
+            self.assertEqual(lzo.decompress(compressed, len(data)), data)
+
+    def test_output_overrun(self):
+        data, compressed = VECTORS[0]
+        self.assertRaisesRegex(ValueError, 'output overrun', lzo._decompress, compressed, len(data) - 1)
+        # literal run and match
+        data, compressed = VECTORS[3]
+        self.assertRaisesRegex(ValueError, 'output overrun', lzo._decompress, compressed, 100)
+        data, compressed = VECTORS[1]
+        self.assertRaisesRegex(ValueError, 'output overrun', lzo._decompress, compressed, 100)
+
+    def test_size_mismatch(self):
+        data, compressed = VECTORS[0]
+        self.assertRaisesRegex(ValueError, 'decompressed size', lzo._decompress, compressed, len(data) + 1)
+
+    def test_input_overrun(self):
+        data, compressed = VECTORS[3]
+        self.assertRaisesRegex(ValueError, 'input overrun', lzo._decompress, compressed[:100], len(data))
+        for data, compressed in VECTORS:
+            for end in (1, len(compressed) // 2, len(compressed) - 3):
+                self.assertRaisesRegex(ValueError, 'overrun', lzo.decompress, compressed[:end], len(data))
+
+    def test_lookbehind_overrun(self):
+        # one literal, then a match 16 bytes back
+        compressed = bytes([18]) + b'a' + bytes([0x60, 0x01]) + bytes([0x11, 0, 0])
+        self.assertRaisesRegex(ValueError, 'lookbehind overrun', lzo._decompress, compressed, 5)
+
+
+class CompressTest(unittest.TestCase):
+    def test_round_trip(self):
+        for data in samples():
+            compressed = lzo._compress(data)
+            self.assertEqual(lzo._decompress(compressed, len(data)), data)
+            self.assertEqual(lzo.decompress(lzo.compress(data), len(data)), data)
+
+    def test_compressed(self):
+        data = b'hello world ' * 1000
+        self.assertLess(len(lzo._compress(data)), len(data) // 20)
+
+
+class PackTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pack(self):
+        rand = random.Random(2)
+        words = sorted(set(''.join(rand.choice('abcdefgh') for _ in range(rand.randint(1, 8)))
+                           for _ in range(500)))
+        source = os.path.join(self.tmpdir, 'dict.txt')
+        with open(source, 'w', encoding='utf-8') as f:
+            for word in words:
+                f.write('%s\n<b>%s</b> is a word, %s\n</>\n' % (word, word, word * 3))
+        target = os.path.join(self.tmpdir, 'dict.mdx')
+        # small record blocks, many blocks are compressed
+        writer.pack(target, writer.pack_mdx_txt(source), 'Title', 'Description',
+                    record_size=4096, compression='lzo')
+
+        self.assertEqual(reader.meta(target)['version'], 1.2)
+        records = ['<b>%s</b> is a word, %s' % (word, word * 3) for word in words]
+        for n in (0, len(words) // 2, len(words) - 1):
+            # record keeps new line of TXT
+            self.assertEqual(reader.query(target, words[n]), records[n] + '\n\0')
+        with reader.Dictionary(target) as d:
+            self.assertEqual(list(d.items()), list(zip(words, records)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,282 @@
+import os
+import random
+import shutil
+import string
+import tempfile
+import unittest
+from unittest import mock
+
+from mdict_utils import reader
+from mdict_utils.base.writemdict import MDictWriter
+
+
+def write_mdx(fname, dictionary, **kwargs):
+    with open(fname, 'wb') as f:
+        MDictWriter(dictionary, 'Title', 'Description', **kwargs).write(f)
+
+
+class SortedKeysTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.dictionary = dict(('%s%d' % (a, n), 'record of %s%d' % (a, n))
+                              for a in string.ascii_lowercase for n in range(100))
+        cls.mdx = os.path.join(cls.tmpdir, 'sorted.mdx')
+        write_mdx(cls.mdx, cls.dictionary)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_index(self):
+        for _ in range(2):
+            with reader.Dictionary(self.mdx, index=True) as d:
+                # key order is saved in sidecar index
+                self.assertTrue(d._md._key_order)
+                d.preload()
+                self.assertNotIsInstance(d._md._key_index, dict)
+                for key in ('a0', 'm55', 'z99'):
+                    self.assertEqual(d.lookup(key), ['record of %s\0' % key])
+                self.assertEqual(d.lookup('M55'), [])
+                self.assertEqual(d.lookup('m555'), [])
+
+    def test_compact(self):
+        for _ in range(2):
+            with reader.Dictionary(self.mdx, compact=True, index=True, lazy=True) as d:
+                # key order is saved in sidecar key list
+                self.assertTrue(d._md._key_order)
+                self.assertIs(d._md._key_index, d._md._key_list)
+                self.assertEqual(d.lookup('m55'), ['record of m55\0'])
+                self.assertEqual(list(d.prefix('z9')), ['z9'] + ['z%d' % n for n in range(90, 100)])
+
+    def test_lazy(self):
+        with reader.Dictionary(self.mdx, lazy=True) as d:
+            self.assertTrue(d._md._lazy)
+            d.preload()
+            # key blocks are read from mmap of Dictionary
+            with mock.patch('mdict_utils.base.readmdict.open', side_effect=AssertionError, create=True):
+                for key in ('a0', 'm55', 'z99'):
+                    self.assertEqual(d.lookup(key), ['record of %s\0' % key])
+
+    def test_get_record(self):
+        md = reader.MDX(self.mdx)
+        locations = md._lookup_key(b'm55')
+        self.assertEqual(reader.get_record_v1v2(md, b'm55', *locations[0]), 'record of m55\0')
+
+    def test_normalize(self):
+        with reader.Dictionary(self.mdx) as d:
+            self.assertEqual(d.lookup('M-55', normalize=True), ['record of m55\0'])
+            self.assertEqual(d.lookup('M-555', normalize=True), [])
+
+
+class FullTextIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.mdx = os.path.join(self.tmpdir, 'fts.mdx')
+        write_mdx(self.mdx, {'cat': 'small animal', 'dog': 'animal which barks'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def search(self, text):
+        with reader.Dictionary(self.mdx) as d:
+            return list(d.search(text))
+
+    def test_search(self):
+        self.assertRaises(RuntimeError, self.search, 'animal')
+        reader.build_fts(self.mdx)
+        self.assertEqual(self.search('animal'), ['cat', 'dog'])
+        self.assertEqual(self.search('barks animal'), ['dog'])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['fts.mdx', 'fts.mdx.fts'])
+
+    def test_out_of_date(self):
+        reader.build_fts(self.mdx)
+        st = os.stat(self.mdx)
+        # same size and mtime, but header checksum differs
+        with open(self.mdx, 'wb') as f:
+            MDictWriter({'cat': 'small animal', 'dog': 'animal which barks'}, 'Tidle', 'Description').write(f)
+        self.assertEqual(os.path.getsize(self.mdx), st.st_size)
+        os.utime(self.mdx, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertRaises(RuntimeError, self.search, 'animal')
+
+
+class RewrittenFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_query(self):
+        # record blocks of the old file are cached by name
+        mdx = os.path.join(self.tmpdir, 'rewrite.mdx')
+        write_mdx(mdx, {'a': 'one', 'b': 'x'})
+        self.assertEqual(reader.query(mdx, 'a'), 'one\0')
+        write_mdx(mdx, {'a': 'two!', 'b': 'x'})
+        self.assertEqual(reader.query(mdx, 'a'), 'two!\0')
+        self.assertEqual(reader.query(mdx, 'b'), 'x\0')
+
+
+class UnsortedKeysTest(unittest.TestCase):
+    """base MDictWriter sorts keys case sensitively, but header is KeyCaseSensitive="No" """
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        rand = random.Random(3)
+        cls.dictionary = {}
+        while len(cls.dictionary) < 3000:
+            key = ''.join(rand.choice(string.ascii_letters) for _ in range(rand.randint(2, 6)))
+            cls.dictionary[key] = 'record of %s' % key
+        cls.mdx = os.path.join(cls.tmpdir, 'unsorted.mdx')
+        write_mdx(cls.mdx, cls.dictionary)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def expected(self, match):
+        return sorted(key for key in self.dictionary if match(key.lower()))
+
+    def check(self, **kwargs):
+        with reader.Dictionary(self.mdx, **kwargs) as d:
+            self.assertEqual(sorted(d.prefix('ab')), self.expected(lambda k: k.startswith('ab')))
+            self.assertEqual(len(list(d.prefix('ab', 2))), 2)
+            self.assertEqual(sorted(d.range('ab', 'ad')), self.expected(lambda k: 'ab' <= k < 'ad'))
+            for key in self.expected(lambda k: k.startswith('ab')):
+                self.assertEqual(d.lookup(key), ['record of %s\0' % key])
+
+    def test_default(self):
+        self.check()
+
+    def test_lazy(self):
+        self.check(lazy=True)
+
+    def test_index(self):
+        # the second one reads the sidecar index
+        self.check(index=True)
+        self.check(index=True)
+
+    def test_compact(self):
+        self.check(compact=True)
+        # the second one reads the sidecar key list
+        self.check(compact=True, index=True, lazy=True)
+        self.check(compact=True, index=True, lazy=True)
+
+
+class UnsortedKeyBlockTest(unittest.TestCase):
+    """key blocks follow the sort order, but keys in one of them do not"""
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.dictionary = {}
+        for a in string.ascii_lowercase:
+            for b in string.ascii_lowercase:
+                key = a + b + 'x'
+                cls.dictionary[key] = 'record of %s' % key
+        # "tZ" is before "tax" in code point, but after it ignoring case
+        cls.dictionary['tZ'] = 'record of tZ'
+        cls.mdx = os.path.join(cls.tmpdir, 'block.mdx')
+        write_mdx(cls.mdx, cls.dictionary, block_size=256)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_lazy_scan(self):
+        with reader.Dictionary(self.mdx, lazy=True) as d:
+            self.assertTrue(d._md._lazy)
+            # unsorted key block is found in the middle of scan
+            keys = list(d.prefix(''))
+            self.assertEqual(sorted(keys), sorted(self.dictionary))
+            self.assertFalse(d._md._lazy)
+
+    def test_lazy_prefix(self):
+        with reader.Dictionary(self.mdx, lazy=True) as d:
+            keys = list(d.prefix('t'))
+            self.assertEqual(sorted(keys), sorted(key for key in self.dictionary if key.startswith('t')))
+            self.assertEqual(d.lookup('tZ'), ['record of tZ\0'])
+            self.assertEqual(list(d.prefix('tz')), ['tZ', 'tzx'])
+
+
+
+class SkippedKeyBlockTest(unittest.TestCase):
+    """unsorted key block is skipped by binary search over key blocks"""
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.dictionary = {'Ca': 'record of Ca', 'Zz': 'record of Zz', 'ca': 'record of ca'}
+        for a in string.ascii_lowercase:
+            for b in string.ascii_lowercase:
+                key = 'c' + a + b
+                cls.dictionary[key] = 'record of %s' % key
+        cls.mdx = os.path.join(cls.tmpdir, 'skipped.mdx')
+        write_mdx(cls.mdx, cls.dictionary, block_size=64)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_lookup(self):
+        for kwargs in ({}, {'lazy': True}, {'lazy': True, 'index': True}):
+            with reader.Dictionary(self.mdx, **kwargs) as d:
+                self.assertEqual(d.lookup('Zz'), ['record of Zz\0'])
+                self.assertEqual(d.lookup('missing'), [])
+                self.assertEqual(d.lookup('cab'), ['record of cab\0'])
+
+    def test_prefix(self):
+        for kwargs in ({}, {'lazy': True}):
+            with reader.Dictionary(self.mdx, **kwargs) as d:
+                self.assertEqual(list(d.prefix('z')), ['Zz'])
+                self.assertEqual(len(list(d.prefix('c'))), 26 * 26 + 2)
+
+    def test_lazy_hit(self):
+        with reader.Dictionary(self.mdx, lazy=True) as d:
+            # found key is trusted in lazy mode, "czz" is in the last key block
+            self.assertEqual(d.lookup('czz'), ['record of czz\0'])
+            self.assertTrue(d._md._lazy)
+
+
+class WorkersTest(unittest.TestCase):
+    """key blocks are decoded in processes"""
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        rand = random.Random(4)
+        cls.dictionary = {}
+        for _ in range(2000):
+            key = ''.join(rand.choice(string.ascii_letters + 'éü ') for _ in range(rand.randint(1, 12))).strip()
+            cls.dictionary[key or 'x'] = 'record of %s' % key
+        # small blocks, many key blocks
+        cls.files = []
+        for name, kwargs in [
+                ('v2.mdx', {}),
+                # 4 bytes numbers, LZO compressed
+                ('v1.mdx', {'version': '1.2', 'compression_type': 1}),
+                ('utf16.mdx', {'encoding': 'utf16'})]:
+            fname = os.path.join(cls.tmpdir, name)
+            write_mdx(fname, cls.dictionary, block_size=256, **kwargs)
+            cls.files.append(fname)
+        fname = os.path.join(cls.tmpdir, 'v2.mdd')
+        write_mdx(fname, dict(('\\%s.png' % key, key.encode('utf-8')) for key in cls.dictionary),
+                  block_size=256, is_mdd=True)
+        cls.files.append(fname)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_key_list(self):
+        for fname in self.files:
+            with reader.Dictionary(fname) as d:
+                self.assertGreater(len(d._md._key_block_heads), 10)
+                key_list = list(d._md._key_list)
+            with reader.Dictionary(fname, workers=3) as d:
+                self.assertEqual(list(d._md._key_list), key_list, fname)
+                if fname.endswith('.mdx'):
+                    self.assertEqual(sorted(d.keys()), sorted(self.dictionary))
+                    for key in list(self.dictionary)[:10]:
+                        self.assertEqual(d.lookup(key), [self.dictionary[key] + '\0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
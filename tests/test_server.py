@@ -0,0 +1,77 @@
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from mdict_utils.server import LookupServer
+from mdict_utils.base.writemdict import MDictWriter
+
+
+class LookupServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        mdx = os.path.join(cls.tmpdir, 'server.mdx')
+        with open(mdx, 'wb') as f:
+            MDictWriter({'hello': '<b>hello</b>'}, 'Title', 'Description').write(f)
+        cls.server = LookupServer(mdx)
+        cls.loop = asyncio.new_event_loop()
+        cls.tcp_server = cls.loop.run_until_complete(
+            asyncio.start_server(cls.server.handle, '127.0.0.1', 0))
+        cls.port = cls.tcp_server.sockets[0].getsockname()[1]
+        cls.thread = threading.Thread(target=cls.loop.run_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.tcp_server.close()
+        cls.loop.run_until_complete(cls.tcp_server.wait_closed())
+        cls.loop.close()
+        cls.server.close()
+        shutil.rmtree(cls.tmpdir)
+
+    def request(self, *requests):
+        """send requests on one keep-alive connection, return list of (status line, body)"""
+        with socket.create_connection(('127.0.0.1', self.port), timeout=5) as sock:
+            for method, url in requests:
+                sock.sendall(('%s %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % (method, url)).encode())
+            sock.sendall(b'GET /entry/hello HTTP/1.1\r\nConnection: close\r\n\r\n')
+            data = b''
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        responses = []
+        for method, url in requests + (('GET', '/entry/hello'),):
+            header, _, data = data.partition(b'\r\n\r\n')
+            lines = header.split(b'\r\n')
+            headers = dict(line.split(b': ', 1) for line in lines[1:])
+            length = 0 if method == 'HEAD' else int(headers[b'Content-Length'])
+            responses.append((lines[0], data[:length]))
+            data = data[length:]
+        self.assertEqual(data, b'')
+        # the last one checks that nothing is left from the previous responses
+        self.assertEqual(responses.pop(), (b'HTTP/1.1 200 OK', b'<b>hello</b>'))
+        return responses
+
+    def test_head(self):
+        # responses of HEAD have no body, else it is read as the next response on the connection
+        self.assertEqual(self.request(('HEAD', '/entry/missing'), ('HEAD', '/entry/hello')), [
+            (b'HTTP/1.1 404 Not Found', b''),
+            (b'HTTP/1.1 200 OK', b''),
+        ])
+
+    def test_get(self):
+        self.assertEqual(self.request(('GET', '/entry/missing'), ('GET', '/entry/hello')), [
+            (b'HTTP/1.1 404 Not Found', b'Not Found'),
+            (b'HTTP/1.1 200 OK', b'<b>hello</b>'),
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
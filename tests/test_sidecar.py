@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from mdict_utils.base import sidecar
+
+
+MAGIC = b'TESTSC01'
+
+
+def layout(numbers):
+    count, data_size = numbers
+    return [(count * 8, 'Q'), (data_size, None)]
+
+
+class SidecarTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'source.mdx')
+        with open(self.source, 'wb') as f:
+            f.write(b'source')
+        self.fname = self.source + '.test'
+        self.stat = sidecar.source_stat(self.source, 1234)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def save(self, stat=None):
+        sidecar.save(self.fname, MAGIC, stat or self.stat, [3, 5], [array('Q', [1, 2, 3]), b'abcde'])
+
+    def test_load(self):
+        self.save()
+        numbers, (values, data) = sidecar.load(self.fname, MAGIC, self.stat, layout)
+        self.assertEqual(numbers, [3, 5])
+        self.assertEqual(values.tolist(), [1, 2, 3])
+        self.assertEqual(bytes(data), b'abcde')
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['source.mdx', 'source.mdx.test'])
+
+    def test_out_of_date(self):
+        self.save()
+        self.assertIsNone(sidecar.load(self.fname, b'TESTSC02', self.stat, layout))
+        # header checksum of source file
+        stat = sidecar.source_stat(self.source, 4321)
+        self.assertIsNone(sidecar.load(self.fname, MAGIC, stat, layout))
+        # size and mtime of source file
+        with open(self.source, 'ab') as f:
+            f.write(b'changed')
+        stat = sidecar.source_stat(self.source, 1234)
+        self.assertIsNone(sidecar.load(self.fname, MAGIC, stat, layout))
+
+    def test_broken(self):
+        self.save()
+        with open(self.fname, 'r+b') as f:
+            f.truncate(os.path.getsize(self.fname) - 8)
+        self.assertIsNone(sidecar.load(self.fname, MAGIC, self.stat, layout))
+        self.assertIsNone(sidecar.load(self.fname, MAGIC, self.stat, lambda numbers: numbers[5]))
+        self.assertIsNone(sidecar.load(self.fname + '.missing', MAGIC, self.stat, layout))
+
+    def test_save_error(self):
+        self.save()
+        with self.assertRaises(TypeError):
+            sidecar.save(self.fname, MAGIC, self.stat, [1], [array('Q', [1]), None])
+        # temporary file is removed and the old file is kept
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['source.mdx', 'source.mdx.test'])
+        self.assertIsNotNone(sidecar.load(self.fname, MAGIC, self.stat, layout))
+
+
+if __name__ == '__main__':
+    unittest.main()
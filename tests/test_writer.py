@@ -0,0 +1,61 @@
+import os
+import random
+import shutil
+import string
+import tempfile
+import unittest
+
+from mdict_utils import reader, writer
+
+
+class PackTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        rand = random.Random(3)
+        cls.entries = []
+        for _ in range(3000):
+            key = ''.join(rand.choice(string.ascii_letters + ' -.') for _ in range(rand.randint(1, 10)))
+            record = '<p>%s</p>' % ' '.join(rand.choice(['red', 'green', 'blue', key]) for _ in range(20))
+            cls.entries.append((key.strip() or 'x', record))
+        # same key in many entries, same sort key of keys in different case
+        cls.entries += [('same', 'first'), ('Same', 'second'), ('same', 'third')]
+        cls.source = os.path.join(cls.tmpdir, 'dict.txt')
+        with open(cls.source, 'w', encoding='utf-8') as f:
+            for key, record in cls.entries:
+                f.write('%s\n%s\n</>\n' % (key, record))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def pack(self, name, **kwargs):
+        target = os.path.join(self.tmpdir, name)
+        if kwargs.get('memory'):
+            dictionary = writer.iter_mdx_txt(self.source)
+        else:
+            dictionary = writer.pack_mdx_txt(self.source)
+        # small blocks, many blocks are compressed
+        writer.pack(target, dictionary, 'Title', 'Description', key_size=1024, record_size=4096, **kwargs)
+        with open(target, 'rb') as f:
+            return target, f.read()
+
+    def test_pack(self):
+        target, data = self.pack('dict.mdx')
+        for name, kwargs in [
+                ('jobs.mdx', {'jobs': 3}),
+                # entries are sorted in many runs of temporary files
+                ('memory.mdx', {'memory': 20000}),
+                ('memory_jobs.mdx', {'memory': 20000, 'jobs': 3})]:
+            self.assertEqual(self.pack(name, **kwargs)[1], data, name)
+
+        sort_key = writer.mdict_sort_key()
+        # sort is stable, same keys keep order of source
+        entries = sorted(self.entries, key=lambda entry: sort_key(entry[0]))
+        with reader.Dictionary(target) as d:
+            self.assertEqual(list(d.items()), entries)
+            self.assertEqual(d.lookup('same'), ['first\n\0', 'third\n\0'])
+
+
+if __name__ == '__main__':
+    unittest.main()